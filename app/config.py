@@ -5,6 +5,9 @@
 
 from __future__ import annotations
 
+from functools import lru_cache
+from typing import Any, TYPE_CHECKING
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
@@ -18,13 +21,26 @@ class Settings(BaseSettings):
     Attributes:
         telegram_token: Токен Telegram бота для API.
         database_url: URL подключения к базе данных PostgreSQL.
+        db_pool_size: Размер пула соединений с базой данных.
+        db_max_overflow: Количество дополнительных соединений сверх пула.
+        db_pool_timeout: Таймаут ожидания свободного соединения в секундах.
+        db_pool_recycle: Время жизни соединения в пуле в секундах.
+        db_pool_pre_ping: Проверять соединение перед выдачей из пула.
         scheduler_enabled: Флаг включения автоматического планировщика.
+        wb_concurrency: Максимум одновременных запросов к WB при плановом
+            отслеживании.
+        always_send_status: Отправлять статус после каждой плановой проверки,
+            даже если уведомлений не было.
         default_device: Устройство по умолчанию для поиска (pc/android/ios).
         webhook_url: URL для webhook режима (опционально).
         webhook_secret: Секретный токен для валидации webhook.
         app_host: Хост для запуска веб-сервера.
         app_port: Порт для запуска веб-сервера.
+        web_workers: Число процессов webhook сервера на одном порту; больше
+            одного — только вместе с redis_url.
         cron_secret: Секретный токен для внешнего cron триггера.
+        redis_url: URL Redis для хранения состояний FSM (опционально); без
+            него состояния хранятся в памяти процесса.
 
     Example:
         >>> from app.config import settings
@@ -32,15 +48,28 @@ class Settings(BaseSettings):
         '123456:ABC-DEF...'
     """
 
+    # frozen: настройки неизменны после загрузки, поэтому их значения можно
+    # безопасно кэшировать в модулях
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
-        extra="ignore"
+        extra="ignore",
+        frozen=True
     )
 
     telegram_token: str | None = Field(None, env="TELEGRAM_TOKEN")
     database_url: str | None = Field(None, env="DATABASE_URL")
+
+    # Настройки пула соединений с базой данных
+    db_pool_size: int = Field(10, env="DB_POOL_SIZE")
+    db_max_overflow: int = Field(20, env="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(30.0, env="DB_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(300, env="DB_POOL_RECYCLE")
+    db_pool_pre_ping: bool = Field(False, env="DB_POOL_PRE_PING")
+
     scheduler_enabled: bool = Field(True, env="SCHEDULER_ENABLED")
+    wb_concurrency: int = Field(16, env="WB_CONCURRENCY")
+    always_send_status: bool = Field(False, env="ALWAYS_SEND_STATUS")
     default_device: str = Field("pc", env="DEFAULT_DEVICE")
 
     # Настройки для режима webhook
@@ -49,10 +78,51 @@ class Settings(BaseSettings):
     webhook_secret: str | None = Field(None, env="WEBHOOK_SECRET")
     app_host: str = Field("0.0.0.0", env="APP_HOST")
     app_port: int = Field(8080, env="PORT")
+    web_workers: int = Field(1, env="WEB_WORKERS")
 
     # Внешний cron триггер
     cron_secret: str | None = Field(None, env="CRON_SECRET")
 
+    # Общее хранилище состояний FSM для нескольких процессов бота
+    redis_url: str | None = Field(None, env="REDIS_URL")
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Возвращает единственный экземпляр настроек приложения.
+
+    Настройки создаются при первом вызове, повторные вызовы возвращают
+    тот же объект без повторного чтения .env файла.
+
+    Returns:
+        Провалидированный экземпляр Settings.
+
+    Example:
+        >>> get_settings() is get_settings()
+        True
+    """
+    return Settings()
+
+
+def __getattr__(name: str) -> Any:
+    """Лениво отдаёт атрибут модуля ``settings`` (PEP 562).
+
+    Настройки создаются только при первом обращении к ``settings``,
+    поэтому импорт модуля не читает .env файл.
+
+    Args:
+        name: Имя запрашиваемого атрибута модуля.
+
+    Returns:
+        Экземпляр Settings для ``settings``.
+
+    Raises:
+        AttributeError: Если атрибут с таким именем не существует.
+    """
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-# Глобальный экземпляр настроек
-settings = Settings()
+if TYPE_CHECKING:
+    settings: Settings
@@ -6,10 +6,13 @@
 
 from __future__ import annotations
 
+import sys
 from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class City:
     """Город с кодом dest для API Wildberries.
 
@@ -23,96 +26,125 @@ class City:
     code: str
     dest: int
 
+    def __post_init__(self) -> None:
+        """Интернирует строки, чтобы одинаковые названия делили память."""
+        object.__setattr__(self, "name", sys.intern(self.name))
+        object.__setattr__(self, "code", sys.intern(self.code))
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class District:
     """Федеральный округ РФ с городами.
 
     Attributes:
         name: Название федерального округа.
         code: Уникальный код округа.
-        cities: Список городов в округе.
+        cities: Кортеж городов в округе.
     """
 
     name: str
     code: str
-    cities: list[City]
+    cities: tuple[City, ...]
+
+    def __post_init__(self) -> None:
+        """Интернирует строки, чтобы одинаковые названия делили память."""
+        object.__setattr__(self, "name", sys.intern(self.name))
+        object.__setattr__(self, "code", sys.intern(self.code))
 
 
 # Примечание: dest коды можно получать программно через WB geo API.
 # Пока используем популярные города с заранее известными кодами.
-DISTRICTS: list[District] = [
+DISTRICTS: tuple[District, ...] = (
 	District(
 		name="Центральный",
 		code="cfo",
-		cities=[
+		cities=(
 			City(name="Москва", code="moskva", dest=-1257786),
 			City(name="Санкт-Петербург", code="spb", dest=-1257801),
 			City(name="Воронеж", code="voronezh", dest=-1257894),
 			City(name="Нижний Новгород", code="nnov", dest=-1257788),
-		],
+		),
 	),
 	District(
 		name="Северо-Западный",
 		code="szfo",
-		cities=[
+		cities=(
 			City(name="Санкт-Петербург", code="spb", dest=-1257801),
 			City(name="Калининград", code="kaliningrad", dest=-1257826),
 			City(name="Архангельск", code="arhangelsk", dest=-1257822),
-		],
+		),
 	),
 	District(
 		name="Южный",
 		code="ufo",
-		cities=[
+		cities=(
 			City(name="Ростов-на-Дону", code="rostov", dest=-1257893),
 			City(name="Краснодар", code="krasnodar", dest=-1257783),
 			City(name="Волгоград", code="volgograd", dest=-1257891),
-		],
+		),
 	),
 	District(
 		name="Приволжский",
 		code="pfo",
-		cities=[
+		cities=(
 			City(name="Казань", code="kazan", dest=-1257787),
 			City(name="Самара", code="samara", dest=-1257888),
 			City(name="Пермь", code="perm", dest=-1257885),
-		],
+		),
 	),
 	District(
 		name="Уральский",
 		code="urfo",
-		cities=[
+		cities=(
 			City(name="Екатеринбург", code="ekb", dest=-1257876),
 			City(name="Челябинск", code="chelyabinsk", dest=-1257874),
 			City(name="Тюмень", code="tyumen", dest=-1257870),
-		],
+		),
 	),
 	District(
 		name="Сибирский",
 		code="sfo",
-		cities=[
+		cities=(
 			City(name="Новосибирск", code="novosibirsk", dest=-1257866),
 			City(name="Красноярск", code="krasnoyarsk", dest=-1257862),
 			City(name="Омск", code="omsk", dest=-1257864),
-		],
+		),
 	),
 	District(
 		name="Дальневосточный",
 		code="dfo",
-		cities=[
+		cities=(
 			City(name="Владивосток", code="vladivostok", dest=-1257853),
 			City(name="Хабаровск", code="habarovsk", dest=-1257855),
 			City(name="Якутск", code="yakutsk", dest=-1257852),
-		],
+		),
 	),
 	District(
 		name="Северо-Кавказский",
 		code="skfo",
-		cities=[
+		cities=(
 			City(name="Махачкала", code="mahachkala", dest=-1257898),
 			City(name="Грозный", code="grozny", dest=-1257901),
 			City(name="Ставрополь", code="stavropol", dest=-1257899),
-		],
+		),
 	),
-]
+)
+
+# Индексы для O(1) поиска по справочнику (только для чтения)
+DISTRICTS_BY_CODE: Mapping[str, District] = MappingProxyType(
+	{d.code: d for d in DISTRICTS}
+)
+CITIES_BY_KEY: Mapping[tuple[str, str], City] = MappingProxyType(
+	{(d.code, c.code): c for d in DISTRICTS for c in d.cities}
+)
+CITY_BY_DEST: Mapping[int, City] = MappingProxyType(
+	{c.dest: c for d in DISTRICTS for c in d.cities}
+)
+
+# Предвычисленные пары (текст, код) для клавиатур выбора региона
+DISTRICT_BUTTONS: tuple[tuple[str, str], ...] = tuple(
+	(d.name, d.code) for d in DISTRICTS
+)
+CITY_BUTTONS_BY_DISTRICT: Mapping[str, tuple[tuple[str, str], ...]] = MappingProxyType(
+	{d.code: tuple((c.name, c.code) for c in d.cities) for d in DISTRICTS}
+)
@@ -8,26 +8,31 @@
 from __future__ import annotations
 
 import asyncio
+from functools import lru_cache
 from typing import AsyncGenerator
 from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import NullPool
 from sqlalchemy import text
 
-from app.config import settings
+from app.config import get_settings
 
 
 # Допустимые режимы SSL для PostgreSQL
-_ALLOWED_SSLMODE = {"disable", "allow", "prefer", "require", "verify-ca", "verify-full"}
+_ALLOWED_SSLMODE = frozenset(
+    {"disable", "allow", "prefer", "require", "verify-ca", "verify-full"}
+)
 
 
+@lru_cache(maxsize=8)
 def _normalize_async_url(url: str) -> str:
     """Нормализует URL базы данных для работы с asyncpg драйвером.
 
     Преобразует различные форматы URL (postgres://, postgresql://) в формат,
     совместимый с asyncpg. Удаляет неподдерживаемые параметры и настраивает
-    SSL для специфичных провайдеров.
+    SSL для специфичных провайдеров. Результат кэшируется по исходному URL.
 
     Args:
         url: Исходный URL подключения к базе данных.
@@ -44,7 +49,14 @@ def _normalize_async_url(url: str) -> str:
         url = "postgresql://" + url[len("postgres://"):]
     if url.startswith("postgresql://") and "+asyncpg" not in url:
         url = "postgresql+asyncpg://" + url[len("postgresql://"):]
-    
+
+    # Без query параметров и не на Neon переписывать нечего
+    if "?" not in url:
+        netloc = url.split("://", 1)[-1].split("/", 1)[0]
+        host = netloc.rsplit("@", 1)[-1].split(":", 1)[0]
+        if not host.endswith("neon.tech"):
+            return url
+
     # Обрабатываем query параметры для asyncpg
     parts = urlparse(url)
     qs = dict(parse_qsl(parts.query, keep_blank_values=True))
@@ -56,7 +68,7 @@ def _normalize_async_url(url: str) -> str:
     # Преобразуем sslmode -> ssl (asyncpg ожидает 'ssl')
     sslmode = qs.pop("sslmode", None)
     if sslmode:
-        val = str(sslmode).lower()
+        val = sslmode.lower()
         if val in _ALLOWED_SSLMODE:
             qs["ssl"] = val
     
@@ -65,14 +77,19 @@ def _normalize_async_url(url: str) -> str:
     if host.endswith("neon.tech") and "ssl" not in qs:
         qs["ssl"] = "require"
     
-    new_query = urlencode(qs)
+    # Стабильный порядок параметров: одинаковые URL дают одинаковый результат
+    new_query = urlencode(sorted(qs.items()))
     return urlunparse((parts.scheme, parts.netloc, parts.path, parts.params, new_query, parts.fragment))
 
 
 # Базовый класс для декларативных моделей SQLAlchemy
 Base = declarative_base()
 
+# Предкомпилированный запрос создания схемы
+_CREATE_SCHEMA_STMT = text("CREATE SCHEMA IF NOT EXISTS wbpos")
+
 # Проверяем наличие DATABASE_URL в настройках
+settings = get_settings()
 if not settings.database_url:
     raise RuntimeError(
         "DATABASE_URL не задан. Установите переменную окружения или "
@@ -81,7 +98,30 @@ if not settings.database_url:
 
 # Создаём асинхронный движок базы данных
 _async_db_url = _normalize_async_url(settings.database_url)
-engine = create_async_engine(_async_db_url, echo=False, pool_pre_ping=True)
+# pre-ping по умолчанию отключён: он добавляет лишний SELECT 1 на каждый
+# checkout. Устаревшие соединения отсекаются через pool_recycle; если БД рвёт
+# простаивающие соединения (например, засыпающий Neon), pre-ping включается
+# через DB_POOL_PRE_PING.
+# Кэши подготовленных выражений asyncpg увеличены под набор мелких
+# повторяющихся SELECT, JIT отключён: на таких запросах он только тратит время.
+engine = create_async_engine(
+    _async_db_url,
+    echo=False,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    # LIFO: под пиковую нагрузку переиспользуются «горячие» соединения,
+    # а лишние простаивают и закрываются по pool_recycle
+    pool_use_lifo=True,
+    connect_args={
+        "server_settings": {"application_name": "wbposbot", "jit": "off"},
+        "timeout": 10,
+        "statement_cache_size": 1024,
+        "prepared_statement_cache_size": 1024,
+    },
+)
 
 # Фабрика для создания асинхронных сессий
 async_session_factory = async_sessionmaker(
@@ -111,16 +151,21 @@ async def init_db() -> None:
     """Инициализирует схему базы данных.
 
     Создаёт схему 'wbpos' (если не существует) и все таблицы,
-    определённые в моделях.
+    определённые в моделях. Использует отдельный движок без пула, который
+    закрывается сразу после инициализации и не держит соединения.
 
     Example:
         >>> await init_db()  # doctest: +SKIP
         # База данных инициализирована
     """
     from app.db import models  # noqa: F401  # импортируем модели для регистрации
-    async with engine.begin() as conn:
-        await conn.execute(text("CREATE SCHEMA IF NOT EXISTS wbpos"))
-        await conn.run_sync(Base.metadata.create_all)
+    init_engine = create_async_engine(_async_db_url, poolclass=NullPool)
+    try:
+        async with init_engine.begin() as conn:
+            await conn.execute(_CREATE_SCHEMA_STMT)
+            await conn.run_sync(Base.metadata.create_all)
+    finally:
+        await init_engine.dispose()
 
 
 def init_db_sync() -> None:
@@ -132,4 +177,4 @@ def init_db_sync() -> None:
         >>> init_db_sync()  # doctest: +SKIP
         # База данных инициализирована синхронно
     """
-    asyncio.get_event_loop().run_until_complete(init_db())
+    asyncio.run(init_db())
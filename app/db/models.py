@@ -6,10 +6,10 @@
 
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import BigInteger, ForeignKey, String, UniqueConstraint
+from sqlalchemy import BigInteger, ForeignKey, Index, String, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -42,7 +42,13 @@ class User(Base):
     region_district: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     region_city: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     dest_code: Mapped[Optional[int]] = mapped_column(nullable=True)
-    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    # default на стороне Python нужен для уже созданных таблиц: create_all
+    # не добавляет server_default существующим колонкам. Колонка хранит UTC
+    # без часового пояса, поэтому tzinfo снимается
+    created_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(timezone.utc).replace(tzinfo=None),
+        server_default=func.timezone("utc", func.now())
+    )
 
     articles: Mapped[list[Article]] = relationship(
         back_populates="user",
@@ -67,6 +73,9 @@ class Article(Base):
 
     __tablename__ = "articles"
     __table_args__ = (
+        # Уникальный индекс uq_user_sku обслуживает поиск дублей (user_id, sku)
+        # и выборки по user_id (ведущая колонка), а также является целевым
+        # для ON CONFLICT при добавлении артикула
         UniqueConstraint("user_id", "sku", name="uq_user_sku"),
         {"schema": "wbpos"},
     )
@@ -77,7 +86,13 @@ class Article(Base):
     )
     sku: Mapped[int] = mapped_column(index=True)
     title: Mapped[Optional[str]] = mapped_column(String(256), nullable=True)
-    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    # default на стороне Python нужен для уже созданных таблиц: create_all
+    # не добавляет server_default существующим колонкам. Колонка хранит UTC
+    # без часового пояса, поэтому tzinfo снимается
+    created_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(timezone.utc).replace(tzinfo=None),
+        server_default=func.timezone("utc", func.now())
+    )
 
     user: Mapped[User] = relationship(back_populates="articles")
     trackings: Mapped[list[Tracking]] = relationship(
@@ -107,6 +122,10 @@ class Tracking(Base):
     __tablename__ = "trackings"
     __table_args__ = (
         UniqueConstraint("article_id", "phrase", name="uq_article_phrase"),
+        Index("ix_trackings_due", "enabled", "last_checked_at"),
+        # Загрузка активных фраз артикула (article_id + enabled) при плановой
+        # проверке; покрывает и выборки только по article_id
+        Index("ix_trackings_article_enabled", "article_id", "enabled"),
         {"schema": "wbpos"},
     )
 
@@ -6,60 +6,57 @@
 
 from __future__ import annotations
 
+import re
+
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message
-from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.types import (
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    Message,
+)
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.db.base import async_session_factory
 from app.db.models import User, Article
+from app.services import user_cache
 from app.services.wb_client import WBClient
 from app.states import AddArticle, AddTracking
 
 router = Router()
 
+# Callback-данные меню артикула; компилируется один раз при импорте
+_ARTICLE_CB_RE = re.compile(r"^article:(\d+)$")
+
 
-def _articles_menu_kb(articles: list[Article]) -> InlineKeyboardBuilder:
+def _articles_menu_kb(articles: list[tuple[int, int]]) -> InlineKeyboardMarkup:
     """Создаёт клавиатуру меню управления артикулами.
 
     Args:
-        articles: Список артикулов пользователя.
+        articles: Пары (ID артикула, SKU) пользователя.
 
     Returns:
-        Клавиатура с кнопками для каждого артикула и управления.
+        Клавиатура с артикулами по два в ряд и кнопками управления.
     """
-    kb = InlineKeyboardBuilder()
-    for a in articles:
-        kb.button(text=f"📦 {a.sku}", callback_data=f"article:{a.id}")
-    kb.button(text="➕ Добавить", callback_data="article:add")
-    kb.button(text="🗑️ Удалить", callback_data="article:delete")
-    kb.button(text="🧾 Все позиции", callback_data="article:check_all")
-    kb.button(text="⬅️ Назад", callback_data="menu:back")
-    kb.adjust(2, 2, 1, 1)
-    return kb
-
-
-async def _ensure_user_by_id(telegram_id: int) -> User:
-    """Получает или создаёт пользователя по Telegram ID.
-
-    Args:
-        telegram_id: ID пользователя в Telegram.
-
-    Returns:
-        Объект пользователя из БД.
-    """
-    async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        if user is None:
-            user = User(telegram_id=telegram_id)
-            session.add(user)
-            await session.commit()
-            await session.refresh(user)
-        return user
+    rows = [
+        [
+            InlineKeyboardButton(text=f"📦 {sku}", callback_data=f"article:{article_id}")
+            for article_id, sku in articles[i:i + 2]
+        ]
+        for i in range(0, len(articles), 2)
+    ]
+    rows.append([
+        InlineKeyboardButton(text="➕ Добавить", callback_data="article:add"),
+        InlineKeyboardButton(text="🗑️ Удалить", callback_data="article:delete"),
+    ])
+    rows.append([
+        InlineKeyboardButton(text="🧾 Все позиции", callback_data="article:check_all")
+    ])
+    rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="menu:back")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
 @router.message(F.text.endswith("Артикулы"))
@@ -69,16 +66,15 @@ async def open_articles_by_text(message: Message) -> None:
     Args:
         message: Входящее сообщение от пользователя.
     """
-    user = await _ensure_user_by_id(message.from_user.id)
     async with async_session_factory() as session:
-        articles = list(
-            (await session.scalars(
-                select(Article).where(Article.user_id == user.id)
-            )).all()
-        )
+        user = await user_cache.ensure_user(session, message.from_user.id)
+        articles = (await session.execute(
+            select(Article.id, Article.sku).where(Article.user_id == user.id)
+        )).all()
+        await session.commit()
     await message.answer(
         "Управление артикулами:",
-        reply_markup=_articles_menu_kb(articles).as_markup()
+        reply_markup=_articles_menu_kb(articles)
     )
 
 
@@ -89,16 +85,15 @@ async def open_articles(cb: CallbackQuery) -> None:
     Args:
         cb: Callback query от пользователя.
     """
-    user = await _ensure_user_by_id(cb.from_user.id)
     async with async_session_factory() as session:
-        articles = list(
-            (await session.scalars(
-                select(Article).where(Article.user_id == user.id)
-            )).all()
-        )
+        user = await user_cache.ensure_user(session, cb.from_user.id)
+        articles = (await session.execute(
+            select(Article.id, Article.sku).where(Article.user_id == user.id)
+        )).all()
+        await session.commit()
     await cb.message.edit_text(
         "Управление артикулами:",
-        reply_markup=_articles_menu_kb(articles).as_markup()
+        reply_markup=_articles_menu_kb(articles)
     )
     await cb.answer()
 
@@ -116,11 +111,26 @@ async def ask_add_article(cb: CallbackQuery, state: FSMContext) -> None:
     await cb.answer()
 
 
-@router.message(AddArticle.waiting_for_sku, F.text.regexp(r"^\d{4,}$"))
+def _is_sku_text(text: str | None) -> bool:
+    """Проверяет, что текст похож на SKU: не меньше 4 цифр.
+
+    Args:
+        text: Текст сообщения.
+
+    Returns:
+        True, если текст состоит только из цифр и их не меньше 4.
+    """
+    # isdecimal() совпадает с \d по набору символов, но без regex-движка
+    return bool(text) and len(text) >= 4 and text.isdecimal()
+
+
+@router.message(AddArticle.waiting_for_sku, F.text.func(_is_sku_text))
 async def add_article_by_text(message: Message, state: FSMContext) -> None:
     """Добавляет новый артикул в БД после ввода SKU.
 
-    Проверяет на дубликаты и запрашивает поисковые фразы для отслеживания.
+    Вставляет артикул через ``ON CONFLICT DO NOTHING``: отсутствие
+    возвращённого ID означает дубликат. Затем запрашивает поисковые фразы
+    для отслеживания.
 
     Args:
         message: Сообщение пользователя с SKU артикула.
@@ -128,27 +138,21 @@ async def add_article_by_text(message: Message, state: FSMContext) -> None:
     """
     sku = int(message.text)
     async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        dup = await session.scalar(
-            select(Article.id).where(
-                Article.user_id == user.id,
-                Article.sku == sku
-            )
+        user = await user_cache.ensure_user(session, message.from_user.id)
+        article_id = await session.scalar(
+            pg_insert(Article)
+            .values(user_id=user.id, sku=sku)
+            .on_conflict_do_nothing(constraint="uq_user_sku")
+            .returning(Article.id)
         )
-        if dup:
-            await message.answer("Такой артикул уже добавлен.")
-            await state.clear()
-            return
-        article = Article(user_id=user.id, sku=sku)
-        session.add(article)
-        await session.flush()
-        await session.refresh(article)
         await session.commit()
+    if article_id is None:
+        await message.answer("Такой артикул уже добавлен.")
+        await state.clear()
+        return
     # Сразу просим фразы для отслеживания
     await state.set_state(AddTracking.waiting_for_phrase)
-    await state.update_data(article_id=article.id)
+    await state.update_data(article_id=article_id)
     await message.answer(
         "✅ Артикул добавлен. Теперь введите фразу(ы) для отслеживания.\n"
         "Можно несколько: через запятую или с новой строки.\n"
@@ -164,22 +168,24 @@ async def ask_delete_article(cb: CallbackQuery) -> None:
         cb: Callback query от пользователя.
     """
     async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == cb.from_user.id)
-        )
-        articles = list(
-            (await session.scalars(
-                select(Article).where(Article.user_id == user.id)
-            )).all()
-        )
-        kb = InlineKeyboardBuilder()
-        for a in articles:
-            kb.button(text=f"📦 {a.sku}", callback_data=f"article:del:{a.id}")
-        kb.button(text="⬅️ Назад", callback_data="menu:articles")
-        kb.adjust(2)
+        # Нужен только ID пользователя — читаем скаляр без ORM-объекта
+        user_id = (await session.execute(
+            select(User.id).where(User.telegram_id == cb.from_user.id)
+        )).scalar_one_or_none()
+        articles = (await session.execute(
+            select(Article.id, Article.sku).where(Article.user_id == user_id)
+        )).all()
+    rows = [
+        [
+            InlineKeyboardButton(text=f"📦 {sku}", callback_data=f"article:del:{article_id}")
+            for article_id, sku in articles[i:i + 2]
+        ]
+        for i in range(0, len(articles), 2)
+    ]
+    rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="menu:articles")])
     await cb.message.edit_text(
         "Выберите артикул для удаления:",
-        reply_markup=kb.as_markup()
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=rows)
     )
     await cb.answer()
 
@@ -188,48 +194,65 @@ async def ask_delete_article(cb: CallbackQuery) -> None:
 async def delete_article(cb: CallbackQuery) -> None:
     """Удаляет выбранный артикул из БД.
 
+    Удаление выполняется одним ``DELETE`` без загрузки объекта: фразы
+    удаляются каскадом на уровне БД (``ON DELETE CASCADE``). Удалить можно
+    только артикул, принадлежащий текущему пользователю.
+
     Args:
         cb: Callback query с ID артикула для удаления.
     """
     article_id = int(cb.data.split(":")[-1])
     async with async_session_factory() as session:
-        article = await session.get(Article, article_id)
-        if article is None:
+        res = await session.execute(
+            delete(Article).where(
+                Article.id == article_id,
+                Article.user_id == (
+                    select(User.id)
+                    .where(User.telegram_id == cb.from_user.id)
+                    .scalar_subquery()
+                ),
+            )
+        )
+        if res.rowcount == 0:
             await cb.answer("Не найдено", show_alert=True)
             return
-        await session.delete(article)
         await session.commit()
     await cb.answer("Удалено")
 
 
-def _article_kb(article_id: int) -> InlineKeyboardBuilder:
+# Шаблон клавиатуры артикула: меняется только ID в callback_data
+_ARTICLE_KB_TEMPLATE = (
+    ("➕ Добавить фразу", "tracking:add:{}"),
+    ("📝 Фразы/пороги", "tracking:list:{}"),
+    ("🔎 Проверить", "tracking:check:{}"),
+    ("⬅️ Назад", "menu:articles"),
+)
+
+
+def _article_kb(article_id: int) -> InlineKeyboardMarkup:
     """Создаёт клавиатуру управления конкретным артикулом.
 
     Args:
         article_id: ID артикула в БД.
 
     Returns:
-        Клавиатура с действиями для артикула.
+        Клавиатура с действиями для артикула, по одной кнопке в ряд.
     """
-    kb = InlineKeyboardBuilder()
-    kb.button(text="➕ Добавить фразу", callback_data=f"tracking:add:{article_id}")
-    kb.button(text="📝 Фразы/пороги", callback_data=f"tracking:list:{article_id}")
-    kb.button(text="🔎 Проверить", callback_data=f"tracking:check:{article_id}")
-    kb.button(text="⬅️ Назад", callback_data="menu:articles")
-    kb.adjust(1)
-    return kb
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=data.format(article_id))]
+        for text, data in _ARTICLE_KB_TEMPLATE
+    ])
 
 
-@router.callback_query(F.data.startswith("article:"))
-async def open_article(cb: CallbackQuery) -> None:
+@router.callback_query(F.data.regexp(_ARTICLE_CB_RE).as_("match"))
+async def open_article(cb: CallbackQuery, match: re.Match[str]) -> None:
     """Открывает меню управления конкретным артикулом.
 
     Args:
         cb: Callback query с ID артикула.
+        match: Результат сопоставления с _ARTICLE_CB_RE.
     """
-    if cb.data in {"article:add", "article:delete", "article:check_all"}:
-        return
-    article_id = int(cb.data.split(":")[1])
+    article_id = int(match[1])
     async with async_session_factory() as session:
         article = await session.get(Article, article_id)
         if not article:
@@ -237,7 +260,7 @@ async def open_article(cb: CallbackQuery) -> None:
             return
     await cb.message.edit_text(
         f"Артикул {article.sku}",
-        reply_markup=_article_kb(article_id).as_markup()
+        reply_markup=_article_kb(article_id)
     )
     await cb.answer()
 
@@ -249,16 +272,6 @@ async def check_all_articles(cb: CallbackQuery) -> None:
     Args:
         cb: Callback query от пользователя.
     """
-    async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == cb.from_user.id)
-        )
-        pairs = list(
-            (await session.execute(
-                select(Article.sku).where(Article.user_id == user.id)
-            )).all()
-        )
-        articles = [row[0] for row in pairs]
     await cb.message.edit_text(
         "Выберите пункт 'Проверить позиции' для детальной проверки."
     )
@@ -3,55 +3,145 @@
 from __future__ import annotations
 
 import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message
-from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import select
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import (
+    BufferedInputFile,
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InputMediaPhoto,
+    Message,
+)
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 
 from app.db.base import async_session_factory
 from app.db.models import User, Article, Tracking
+from app.services import user_cache
 from app.services.wb_client import WBClient
 
 router = Router()
 
+# Минимальный интервал между правками сообщения с прогрессом (секунды)
+DEFAULT_EDIT_INTERVAL = 0.8
+# Максимальная длина подписи к фото в Telegram
+_CAPTION_LIMIT = 1024
+# Максимальная длина текста сообщения в Telegram
+_MESSAGE_LIMIT = 4096
+# Максимальное число фото в одном альбоме Telegram
+_ALBUM_LIMIT = 10
+
+# Максимальное число запоминаемых file_id картинок
+_FILE_ID_CACHE_MAXSIZE = 10_000
+
+
+class _FileIdCache(OrderedDict[int, str]):
+    """Словарь file_id картинок по SKU с вытеснением давно не использованных.
+
+    Example:
+        >>> cache = _FileIdCache(maxsize=1)
+        >>> cache[1] = "a"; cache[2] = "b"
+        >>> list(cache)
+        [2]
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        """Создаёт пустой кэш.
+
+        Args:
+            maxsize: Максимальное число записей.
+        """
+        super().__init__()
+        self._maxsize = maxsize
+
+    def get(self, key: int, default: Optional[str] = None) -> Optional[str]:
+        """Возвращает file_id и отмечает запись как недавно использованную."""
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key: int, value: str) -> None:
+        """Запоминает file_id, вытесняя самую старую запись при переполнении."""
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self._maxsize:
+            self.popitem(last=False)
 
-def _manual_kb(articles: list[Article]) -> InlineKeyboardBuilder:
+
+# file_id уже загруженных в Telegram картинок по SKU
+_sku_file_id = _FileIdCache(_FILE_ID_CACHE_MAXSIZE)
+
+
+async def _no_image() -> None:
+    """Заглушка загрузки картинки для SKU с уже известным file_id."""
+    return None
+
+
+def _manual_kb(articles: list[tuple[int, int]]) -> InlineKeyboardMarkup:
     """Создаёт клавиатуру для ручной проверки позиций.
 
     Args:
-        articles: Список артикулов пользователя.
+        articles: Пары (ID артикула, SKU) пользователя.
+
+    Returns:
+        Клавиатура с артикулами по два в ряд и кнопкой общей проверки.
+    """
+    rows = [
+        [
+            InlineKeyboardButton(text=f"📦 {sku}", callback_data=f"manual:one:{article_id}")
+            for article_id, sku in articles[i:i + 2]
+        ]
+        for i in range(0, len(articles), 2)
+    ]
+    rows.append([InlineKeyboardButton(text="🧾 Все артикулы", callback_data="manual:all")])
+    rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="menu:back")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+async def _position_for_phrase(
+    client: WBClient,
+    *,
+    sku: int,
+    device: str,
+    dest: int,
+    phrase: str
+) -> tuple[str, int | None]:
+    """Получает позицию товара по одной фразе.
+
+    Частоту запросов к WB ограничивает сам клиент.
+
+    Args:
+        client: Экземпляр WB-клиента.
+        sku: SKU товара.
+        device: Тип устройства.
+        dest: Код региона доставки.
+        phrase: Поисковая фраза.
 
     Returns:
-        Клавиатура с кнопками артикулов и общей проверки.
+        Кортеж (фраза, позиция). Позиция None, если не найдено.
     """
-    kb = InlineKeyboardBuilder()
-    for a in articles:
-        kb.button(text=f"📦 {a.sku}", callback_data=f"manual:one:{a.id}")
-    kb.button(text="🧾 Все артикулы", callback_data="manual:all")
-    kb.button(text="⬅️ Назад", callback_data="menu:back")
-    kb.adjust(2, 1, 1)
-    return kb
+    pos = await client.get_product_position(
+        sku=sku, query=phrase, device=device, dest=dest
+    )
+    return phrase, pos
 
 
-async def _ensure_user_by_id(telegram_id: int) -> User:
-    """Получает пользователя из БД, создаёт если отсутствует.
+def _phrase_key(phrase: str) -> str:
+    """Возвращает ключ фразы для объединения одинаковых запросов к WB.
 
     Args:
-        telegram_id: Telegram ID пользователя.
+        phrase: Поисковая фраза.
 
     Returns:
-        Объект User из БД.
+        Фраза без крайних пробелов в нижнем регистре.
     """
-    async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        if user is None:
-            user = User(telegram_id=telegram_id)
-            session.add(user)
-            await session.commit()
-            await session.refresh(user)
-        return user
+    return phrase.strip().lower()
 
 
 async def _get_positions_for_phrases(
@@ -60,29 +150,114 @@ async def _get_positions_for_phrases(
     sku: int,
     device: str,
     dest: int,
-    phrases: list[str],
-    semaphore: asyncio.Semaphore
+    phrases: list[str]
 ) -> list[tuple[str, int | None]]:
     """Получает позиции товара по списку фраз параллельно.
 
+    Фразы, совпадающие без учёта регистра и крайних пробелов, запрашиваются
+    у WB один раз; результат раскладывается обратно по исходному списку.
+
     Args:
         client: Экземпляр WB-клиента.
         sku: SKU товара.
         device: Тип устройства ('mobile' / 'desktop').
         dest: Код региона доставки.
         phrases: Список поисковых фраз.
-        semaphore: Семафор для ограничения конкуренции.
 
     Returns:
-        Список кортежей (фраза, позиция). Позиция None, если не найдено.
+        Список кортежей (фраза, позиция) в порядке ``phrases``.
+        Позиция None, если не найдено.
     """
-    async def one(phrase: str) -> tuple[str, int | None]:
-        async with semaphore:
-            pos = await client.get_product_position(
-                sku=sku, query=phrase, device=device, dest=dest
-            )
-            return phrase, pos
-    return await asyncio.gather(*(one(p) for p in phrases))
+    unique = {_phrase_key(p): p for p in phrases}
+    async with asyncio.TaskGroup() as tg:
+        tasks = [
+            tg.create_task(_position_for_phrase(
+                client, sku=sku, device=device, dest=dest, phrase=p
+            ))
+            for p in unique.values()
+        ]
+    by_key = {key: t.result()[1] for key, t in zip(unique, tasks)}
+    return [(p, by_key[_phrase_key(p)]) for p in phrases]
+
+
+async def _send_report(
+    message: Message,
+    caption: str,
+    img_bytes: bytes | None,
+    title: str,
+    sku: int
+) -> None:
+    """Отправляет отчёт по артикулу без промежуточных сообщений.
+
+    С картинкой отчёт уходит подписью к фото. Если подпись длиннее лимита
+    Telegram, фото отправляется с коротким заголовком, а отчёт — отдельно.
+    Если картинка этого SKU уже загружалась в Telegram, повторно
+    используется её file_id, и байты не нужны.
+
+    Args:
+        message: Сообщение, в чат которого отправляется отчёт.
+        caption: Полный текст отчёта.
+        img_bytes: Байты картинки товара или None.
+        title: Короткая подпись к фото для длинных отчётов.
+        sku: SKU товара, используется в имени файла картинки.
+    """
+    file_id = _sku_file_id.get(sku)
+    if file_id is None and not img_bytes:
+        await message.answer(caption)
+        return
+    # Оборачиваем байты сами, с готовым именем файла
+    photo = file_id or BufferedInputFile(img_bytes, filename=f"{sku}.jpg")
+    fits = len(caption) <= _CAPTION_LIMIT
+    try:
+        sent = await message.answer_photo(
+            photo=photo, caption=caption if fits else title
+        )
+    except TelegramBadRequest:
+        if file_id is None:
+            raise
+        # file_id больше не принимается — забываем его и шлём текст
+        _sku_file_id.pop(sku, None)
+        await message.answer(caption)
+        return
+    if file_id is None and sent.photo:
+        _sku_file_id[sku] = sent.photo[-1].file_id
+    if not fits:
+        await message.answer(caption)
+
+
+async def _send_album(
+    message: Message,
+    reports: list[tuple[str, bytes | None, str, int]]
+) -> None:
+    """Отправляет несколько отчётов одним альбомом (sendMediaGroup).
+
+    Каждый отчёт становится фото со своей подписью. Все подписи должны
+    укладываться в лимит, а у каждого SKU должна быть картинка или её
+    file_id. Если Telegram отклоняет альбом, отчёты отправляются по одному.
+
+    Args:
+        message: Сообщение, в чат которого отправляются отчёты.
+        reports: От 2 до 10 отчётов в виде аргументов ``_send_report``
+            (подпись, картинка, заголовок, SKU).
+    """
+    media = [
+        InputMediaPhoto(
+            media=_sku_file_id.get(sku)
+            or BufferedInputFile(img_bytes, filename=f"{sku}.jpg"),
+            caption=caption
+        )
+        for caption, img_bytes, _, sku in reports
+    ]
+    try:
+        sent = await message.answer_media_group(media=media)
+    except TelegramBadRequest:
+        # Например, устаревший file_id — _send_report разберётся с каждым
+        for report in reports:
+            await _send_report(message, *report)
+        return
+    for (_, _, _, sku), msg in zip(reports, sent):
+        if msg.photo:
+            _sku_file_id[sku] = msg.photo[-1].file_id
 
 
 @router.message(F.text.endswith("Проверить позиции"))
@@ -92,17 +267,18 @@ async def open_manual_by_text(message: Message) -> None:
     Args:
         message: Сообщение с текстом кнопки.
     """
-    user = await _ensure_user_by_id(message.from_user.id)
     async with async_session_factory() as session:
-        articles = await session.scalars(
-            select(Article)
+        user = await user_cache.ensure_user(session, message.from_user.id)
+        articles = await session.execute(
+            select(Article.id, Article.sku)
             .where(Article.user_id == user.id)
             .order_by(Article.id.asc())
         )
-        article_list = list(articles)
+        article_list = articles.all()
+        await session.commit()
     await message.answer(
         "Проверка текущих позиций:",
-        reply_markup=_manual_kb(article_list).as_markup()
+        reply_markup=_manual_kb(article_list)
     )
 
 
@@ -113,106 +289,127 @@ async def open_manual(cb: CallbackQuery) -> None:
     Args:
         cb: Callback query пользователя.
     """
-    user = await _ensure_user_by_id(cb.from_user.id)
     async with async_session_factory() as session:
-        articles = await session.scalars(
-            select(Article)
+        user = await user_cache.ensure_user(session, cb.from_user.id)
+        articles = await session.execute(
+            select(Article.id, Article.sku)
             .where(Article.user_id == user.id)
             .order_by(Article.id.asc())
         )
-        article_list = list(articles)
+        article_list = articles.all()
+        await session.commit()
     await cb.message.edit_text(
         "Проверка текущих позиций:",
-        reply_markup=_manual_kb(article_list).as_markup()
+        reply_markup=_manual_kb(article_list)
     )
     await cb.answer()
 
 
 @router.callback_query(F.data.startswith("manual:one:"))
-async def check_one(cb: CallbackQuery) -> None:
+async def check_one(cb: CallbackQuery, wb_client: WBClient) -> None:
     """Проверяет позиции одного артикула по всем фразам.
 
     Args:
         cb: Callback query с ID артикула.
+        wb_client: Общий клиент Wildberries из данных диспетчера.
     """
     await cb.answer("Проверяю...", show_alert=False)
     article_id = int(cb.data.split(":")[-1])
     async with async_session_factory() as session:
-        row = await session.execute(
+        # Одна строка на фразу: поля артикула и пользователя повторяются,
+        # зато всё читается за один запрос
+        rows = (await session.execute(
             select(
                 Article.sku,
                 User.device,
                 User.dest_code,
                 User.auto_update_enabled,
                 User.region_city,
-                User.region_district
+                User.region_district,
+                Tracking.phrase
             )
             .join(User, Article.user_id == User.id)
+            .outerjoin(Tracking, Tracking.article_id == Article.id)
             .where(Article.id == article_id, User.telegram_id == cb.from_user.id)
+            .order_by(Tracking.id)
+        )).all()
+    if not rows:
+        await cb.message.edit_text("Не найдено")
+        return
+    sku, device, dest, auto_update_enabled, region_city, region_district, _ = rows[0]
+    phrases = [r.phrase for r in rows if r.phrase is not None]
+    dest = dest or -1257786
+    # Фразы, совпадающие без учёта регистра, запрашиваются у WB один раз
+    unique = {_phrase_key(p): p for p in phrases}
+    # Превью, картинка и позиции независимы — запускаем их одновременно.
+    # При ошибке или отмене обработчика TaskGroup отменяет остальные задачи
+    async with asyncio.TaskGroup() as tg:
+        preview_task = tg.create_task(
+            wb_client.get_product_preview(sku=sku, device=device, dest=dest)
         )
-        res = row.first()
-        if not res:
-            await cb.message.edit_text("Не найдено")
-            return
-        sku, device, dest, auto_update_enabled, region_city, region_district = res
-        phrases = list(
-            (await session.scalars(
-                select(Tracking.phrase).where(Tracking.article_id == article_id)
-            )).all()
-        )
-    async with WBClient() as client:
-        name, _, page_url = await client.get_product_preview(
-            sku=sku, device=device, dest=dest or -1257786
+        # Картинку качаем, только если её file_id ещё не известен
+        image_task = (
+            tg.create_task(wb_client.fetch_image_bytes_for_sku(sku))
+            if sku not in _sku_file_id else None
         )
-        progress = await cb.message.answer(
-            f"Ищу позиции для {sku}... 0/{len(phrases)}"
-        )
-        sem = asyncio.Semaphore(6)
-        results: list[tuple[str, int | None]] = []
-        for idx, item in enumerate(
-            await _get_positions_for_phrases(
-                client,
-                sku=sku,
-                device=device,
-                dest=dest or -1257786,
-                phrases=phrases,
-                semaphore=sem
-            ),
-            start=1
-        ):
-            results.append(item)
-            try:
-                await progress.edit_text(
-                    f"Ищу позиции для {sku}... {idx}/{len(phrases)}"
-                )
-            except Exception:
-                pass
-        lines = [
-            f"{phrase}: {pos if pos is not None else '—'}"
-            for phrase, pos in results
+        phrase_tasks = [
+            tg.create_task(_position_for_phrase(
+                wb_client, sku=sku, device=device, dest=dest, phrase=phrase
+            ))
+            for phrase in unique.values()
         ]
-        region = region_city or region_district or "Не выбран"
-        status = (
-            f"\n\n⚙️ Устройство: <b>{device}</b> | "
-            f"🗺️ Регион: <b>{region}</b> | "
-            f"🔁 Автообновление: <b>"
-            f"{'Включено' if auto_update_enabled else 'Отключено'}</b>"
-        )
-        caption = (
-            (name or f"Артикул {sku}") +
-            f"\n" + "\n".join(lines) +
-            f"\n\nСсылка: {page_url}" + status
+        progress = await cb.message.answer(
+            f"Ищу позиции для {sku}... 0/{len(unique)}"
         )
-        # сначала текст
-        msg = await cb.message.answer(caption)
-        # пробуем быстро подгрузить картинку отдельно
-        img_bytes = await client.fetch_image_bytes_for_sku(sku)
-        if img_bytes:
+        found: dict[str, int | None] = {}
+        # Готовые строки в порядке поступления: показываются сразу в прогрессе
+        ready_lines: list[str] = []
+        last_edit_ts = 0.0
+        last_text = ""
+        for idx, fut in enumerate(asyncio.as_completed(phrase_tasks), start=1):
+            phrase, pos = await fut
+            found[_phrase_key(phrase)] = pos
+            ready_lines.append(f"{phrase}: {pos if pos is not None else '—'}")
+            # Telegram ограничивает частоту правок: не чаще раза в интервал
+            if (time.monotonic() - last_edit_ts < DEFAULT_EDIT_INTERVAL
+                    and idx != len(unique)):
+                continue
+            header = f"Ищу позиции для {sku}... {idx}/{len(unique)}"
+            text = header + "\n" + "\n".join(ready_lines)
+            if len(text) > _MESSAGE_LIMIT:
+                text = header
+            if text == last_text:
+                continue
             try:
-                await msg.delete()
+                await progress.edit_text(text)
+                last_text = text
+            except TelegramRetryAfter as exc:
+                await asyncio.sleep(exc.retry_after)
             except Exception:
                 pass
-            await cb.message.answer_photo(photo=img_bytes, caption=caption)
+            last_edit_ts = time.monotonic()
+    preview = preview_task.result()
+    name, page_url = preview.name, preview.page_url
+    img_bytes = image_task.result() if image_task is not None else None
+    lines: list[str] = []
+    for phrase in phrases:
+        pos = found[_phrase_key(phrase)]
+        lines.append(f"{phrase}: {pos if pos is not None else '—'}")
+    region = region_city or region_district or "Не выбран"
+    status = (
+        f"\n\n⚙️ Устройство: <b>{device}</b> | "
+        f"🗺️ Регион: <b>{region}</b> | "
+        f"🔁 Автообновление: <b>"
+        f"{'Включено' if auto_update_enabled else 'Отключено'}</b>"
+    )
+    caption = (
+        (name or f"Артикул {sku}") +
+        f"\n" + "\n".join(lines) +
+        f"\n\nСсылка: {page_url}" + status
+    )
+    await _send_report(
+        cb.message, caption, img_bytes, name or f"Артикул {sku}", sku
+    )
     try:
         await cb.message.delete()
     except Exception:
@@ -225,29 +422,36 @@ async def check_one(cb: CallbackQuery) -> None:
 
 
 @router.callback_query(F.data == "manual:all")
-async def check_all(cb: CallbackQuery) -> None:
+async def check_all(cb: CallbackQuery, wb_client: WBClient) -> None:
     """Проверяет позиции всех артикулов пользователя параллельно.
 
     Args:
         cb: Callback query пользователя.
+        wb_client: Общий клиент Wildberries из данных диспетчера.
     """
     await cb.answer("Проверяю...", show_alert=False)
-    user = await _ensure_user_by_id(cb.from_user.id)
     async with async_session_factory() as session:
-        rows = list(
-            (await session.execute(
-                select(Article.sku, Tracking.phrase).where(
-                    Article.user_id == user.id,
-                    Tracking.article_id == Article.id
-                )
-            )).all()
+        user = await user_cache.ensure_user(session, cb.from_user.id)
+        # Фразы собираются в массив на стороне БД: одна строка на артикул,
+        # артикулы без фраз отсекает внутренний JOIN
+        rows = await session.execute(
+            select(
+                Article.sku,
+                func.array_agg(aggregate_order_by(Tracking.phrase, Tracking.id))
+            )
+            .join(Tracking, Tracking.article_id == Article.id)
+            .where(Article.user_id == user.id)
+            .group_by(Article.id, Article.sku)
+            .order_by(Article.id)
         )
+        sku_to_phrases: dict[int, list[str]] = {
+            int(sku): phrases for sku, phrases in rows
+        }
         device = user.device
         dest = user.dest_code or -1257786
         region = user.region_city or user.region_district or "Не выбран"
-    sku_to_phrases: dict[int, list[str]] = {}
-    for sku, phrase in rows:
-        sku_to_phrases.setdefault(int(sku), []).append(phrase)
+        auto_update_enabled = user.auto_update_enabled
+        await session.commit()
     total = len(sku_to_phrases)
     try:
         await cb.message.delete()
@@ -255,58 +459,90 @@ async def check_all(cb: CallbackQuery) -> None:
         pass
     progress = await cb.message.answer(f"Ищу позиции... 0/{total} артикулов")
     processed = 0
-    async with WBClient() as client:
-        sem = asyncio.Semaphore(8)
+    # Строка статуса одинакова для всех артикулов — собираем её один раз
+    status = (
+        f"\n\n⚙️ Устройство: <b>{device}</b> | "
+        f"🗺️ Регион: <b>{region}</b> | "
+        f"🔁 Автообновление: <b>"
+        f"{'Включено' if auto_update_enabled else 'Отключено'}</b>"
+    )
+    # Не больше 4 артикулов одновременно; частоту поисковых запросов
+    # ограничивает общий лимитер WB-клиента
+    sku_sem = asyncio.Semaphore(4)
 
-        async def process_sku(sku: int, phrases: list[str]) -> None:
-            """Обрабатывает один артикул: получает позиции, формирует отчёт с картинкой."""
-            name, _, page_url = await client.get_product_preview(
-                sku=sku, device=device, dest=dest
-            )
-            pairs = await _get_positions_for_phrases(
-                client,
-                sku=sku,
-                device=device,
-                dest=dest,
-                phrases=phrases,
-                semaphore=sem
+    async def process_sku(
+        sku: int, phrases: list[str]
+    ) -> tuple[str, bytes | None, str, int]:
+        """Обрабатывает один артикул: получает позиции и формирует отчёт.
+
+        Returns:
+            Аргументы для отправки отчёта: (подпись, картинка, заголовок, SKU).
+        """
+        async with sku_sem:
+            # Картинку качаем вместе с позициями этого же артикула и только
+            # если её file_id ещё не известен: отчёт не ждёт чужих картинок
+            preview, pairs, img_bytes = await asyncio.gather(
+                wb_client.get_product_preview(sku=sku, device=device, dest=dest),
+                _get_positions_for_phrases(
+                    wb_client,
+                    sku=sku,
+                    device=device,
+                    dest=dest,
+                    phrases=phrases
+                ),
+                wb_client.fetch_image_bytes_for_sku(sku)
+                if sku not in _sku_file_id else _no_image()
             )
+            name, page_url = preview.name, preview.page_url
             lines = [
                 f"- {phrase}: {pos if pos is not None else '—'}"
                 for phrase, pos in pairs
             ]
-            status = (
-                f"\n\n⚙️ Устройство: <b>{device}</b> | "
-                f"🗺️ Регион: <b>{region}</b> | "
-                f"🔁 Автообновление: <b>"
-                f"{'Включено' if user.auto_update_enabled else 'Отключено'}</b>"
-            )
             caption = (
                 f"{sku} — {name or ''}\n" +
                 "\n".join(lines) +
                 f"\nСсылка: {page_url}" + status
             )
-            # сначала текст
-            msg = await cb.message.answer(caption)
-            img_bytes = await client.fetch_image_bytes_for_sku(sku)
-            if img_bytes:
-                try:
-                    await msg.delete()
-                except Exception:
-                    pass
-                await cb.message.answer_photo(photo=img_bytes, caption=caption)
-            nonlocal processed
+            return caption, img_bytes, f"{sku} — {name or ''}", sku
+
+    # При ошибке или отмене обработчика TaskGroup отменяет остальные задачи
+    async with asyncio.TaskGroup() as tg:
+        tasks = [
+            tg.create_task(process_sku(s, p))
+            for s, p in sku_to_phrases.items()
+        ]
+        # Отчёты с картинкой и короткой подписью копятся и уходят альбомами
+        album: list[tuple[str, bytes | None, str, int]] = []
+        last_edit_ts = 0.0
+        for fut in asyncio.as_completed(tasks):
+            report = await fut
+            caption, img_bytes, _, sku = report
+            if (len(caption) <= _CAPTION_LIMIT
+                    and (img_bytes or sku in _sku_file_id)):
+                album.append(report)
+                if len(album) == _ALBUM_LIMIT:
+                    await _send_album(cb.message, album)
+                    album.clear()
+            else:
+                await _send_report(cb.message, *report)
             processed += 1
+            # Прогресс обновляем в порядке завершения и не чаще раза в интервал
+            if (time.monotonic() - last_edit_ts < DEFAULT_EDIT_INTERVAL
+                    and processed != total):
+                continue
             try:
                 await progress.edit_text(
                     f"Ищу позиции... {processed}/{total} артикулов"
                 )
+            except TelegramRetryAfter as exc:
+                await asyncio.sleep(exc.retry_after)
             except Exception:
                 pass
-
-        await asyncio.gather(
-            *(process_sku(s, p) for s, p in sku_to_phrases.items())
-        )
+            last_edit_ts = time.monotonic()
+    if len(album) == 1:
+        await _send_report(cb.message, *album[0])
+    elif album:
+        await _send_album(cb.message, album)
     try:
         await progress.edit_text(f"Готово: {processed}/{total} артикулов")
     except Exception:
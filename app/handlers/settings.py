@@ -6,38 +6,53 @@
 
 from __future__ import annotations
 
+from functools import lru_cache
+from typing import Any
+
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import select
+from sqlalchemy import not_, update
 
 from app.db.base import async_session_factory
 from app.db.models import User
-from app.data.regions import DISTRICTS
+from app.services import user_cache
+from app.services.user_cache import UserSnapshot
+from app.data.regions import (
+    CITIES_BY_KEY,
+    CITY_BUTTONS_BY_DISTRICT,
+    DISTRICT_BUTTONS,
+    DISTRICTS_BY_CODE,
+)
 
 router = Router()
 
 
-def _settings_kb(user: User) -> InlineKeyboardBuilder:
+@lru_cache(maxsize=256)
+def _settings_kb(auto_update_enabled: bool, device: str) -> InlineKeyboardMarkup:
     """Создаёт клавиатуру настроек пользователя.
 
+    Клавиатура зависит только от флага автообновления и устройства,
+    поэтому готовая разметка кэшируется по этим значениям.
+
     Args:
-        user: Объект пользователя из БД.
+        auto_update_enabled: Включено ли автообновление.
+        device: Тип устройства пользователя.
 
     Returns:
         Клавиатура с кнопками настроек.
     """
     kb = InlineKeyboardBuilder()
     auto_text = (
-        "⏸️ Отключить автообновление" if user.auto_update_enabled 
+        "⏸️ Отключить автообновление" if auto_update_enabled 
         else "▶️ Включить автообновление"
     )
     kb.button(text=auto_text, callback_data="settings:toggle_auto")
-    kb.button(text=f"📱 Устройство: {user.device}", callback_data="settings:device")
+    kb.button(text=f"📱 Устройство: {device}", callback_data="settings:device")
     kb.button(text="🗺️ Регион", callback_data="settings:region")
     kb.button(text="⬅️ Назад", callback_data="menu:back")
     kb.adjust(1)
-    return kb
+    return kb.as_markup()
 
 
 @router.message(F.text.endswith("Настройки"))
@@ -48,10 +63,11 @@ async def open_settings_by_text(message: Message) -> None:
         message: Входящее сообщение от пользователя.
     """
     async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-    await message.answer("Настройки:", reply_markup=_settings_kb(user).as_markup())
+        user = await user_cache.get_user(session, message.from_user.id)
+    await message.answer(
+        "Настройки:",
+        reply_markup=_settings_kb(user.auto_update_enabled, user.device)
+    )
 
 
 @router.callback_query(F.data == "menu:settings")
@@ -62,12 +78,36 @@ async def open_settings(cb: CallbackQuery) -> None:
         cb: Callback query от пользователя.
     """
     async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == cb.from_user.id)
-        )
+        user = await user_cache.get_user(session, cb.from_user.id)
+    await cb.message.edit_text(
+        "Настройки:",
+        reply_markup=_settings_kb(user.auto_update_enabled, user.device)
+    )
+    await cb.answer()
+
+
+async def _update_settings(cb: CallbackQuery, **values: Any) -> None:
+    """Сохраняет настройки пользователя и показывает обновлённое меню.
+
+    Выполняет ``UPDATE ... RETURNING``: клавиатура строится из возвращённой
+    строки без повторного чтения, а свежий снимок сразу кладётся в кэш.
+
+    Args:
+        cb: Callback query от пользователя.
+        **values: Новые значения колонок пользователя.
+    """
+    async with async_session_factory() as session:
+        row = (await session.execute(
+            update(User)
+            .where(User.telegram_id == cb.from_user.id)
+            .values(**values)
+            .returning(*user_cache.SNAPSHOT_COLUMNS)
+        )).one()
+        await session.commit()
+    user = user_cache.put(cb.from_user.id, UserSnapshot(*row))
     await cb.message.edit_text(
         "Настройки:",
-        reply_markup=_settings_kb(user).as_markup()
+        reply_markup=_settings_kb(user.auto_update_enabled, user.device)
     )
     await cb.answer()
 
@@ -79,13 +119,7 @@ async def toggle_auto(cb: CallbackQuery) -> None:
     Args:
         cb: Callback query от пользователя.
     """
-    async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == cb.from_user.id)
-        )
-        user.auto_update_enabled = not user.auto_update_enabled
-        await session.commit()
-    await open_settings(cb)
+    await _update_settings(cb, auto_update_enabled=not_(User.auto_update_enabled))
 
 
 # Эмодзи для типов устройств
@@ -98,12 +132,12 @@ device_emoji = {
 }
 
 
-@router.callback_query(F.data == "settings:device")
-async def choose_device(cb: CallbackQuery) -> None:
-    """Открывает меню выбора типа устройства.
+@lru_cache(maxsize=1)
+def _device_kb() -> InlineKeyboardMarkup:
+    """Создаёт клавиатуру выбора устройства.
 
-    Args:
-        cb: Callback query от пользователя.
+    Returns:
+        Клавиатура с типами устройств, строится один раз.
     """
     kb = InlineKeyboardBuilder()
     for d in ["pc", "android", "ios", "iphone", "tablet"]:
@@ -113,9 +147,19 @@ async def choose_device(cb: CallbackQuery) -> None:
         )
     kb.button(text="⬅️ Назад", callback_data="menu:settings")
     kb.adjust(3, 2)
+    return kb.as_markup()
+
+
+@router.callback_query(F.data == "settings:device")
+async def choose_device(cb: CallbackQuery) -> None:
+    """Открывает меню выбора типа устройства.
+
+    Args:
+        cb: Callback query от пользователя.
+    """
     await cb.message.edit_text(
         "Выберите устройство:",
-        reply_markup=kb.as_markup()
+        reply_markup=_device_kb()
     )
     await cb.answer()
 
@@ -128,13 +172,25 @@ async def set_device(cb: CallbackQuery) -> None:
         cb: Callback query от пользователя с выбранным устройством.
     """
     device = cb.data.split(":")[-1]
-    async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == cb.from_user.id)
+    await _update_settings(cb, device=device)
+
+
+@lru_cache(maxsize=1)
+def _district_kb() -> InlineKeyboardMarkup:
+    """Создаёт клавиатуру выбора федерального округа.
+
+    Returns:
+        Клавиатура с округами, строится один раз.
+    """
+    kb = InlineKeyboardBuilder()
+    for name, code in DISTRICT_BUTTONS:
+        kb.button(
+            text=f"🗺️ {name}",
+            callback_data=f"settings:district:{code}"
         )
-        user.device = device
-        await session.commit()
-    await open_settings(cb)
+    kb.button(text="⬅️ Назад", callback_data="menu:settings")
+    kb.adjust(1)
+    return kb.as_markup()
 
 
 @router.callback_query(F.data == "settings:region")
@@ -144,41 +200,48 @@ async def choose_district(cb: CallbackQuery) -> None:
     Args:
         cb: Callback query от пользователя.
     """
-    kb = InlineKeyboardBuilder()
-    for district in DISTRICTS:
-        kb.button(
-            text=f"🗺️ {district.name}",
-            callback_data=f"settings:district:{district.code}"
-        )
-    kb.button(text="⬅️ Назад", callback_data="menu:settings")
-    kb.adjust(1)
     await cb.message.edit_text(
         "Выберите федеральный округ:",
-        reply_markup=kb.as_markup()
+        reply_markup=_district_kb()
     )
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("settings:district:"))
-async def choose_city(cb: CallbackQuery) -> None:
-    """Открывает меню выбора города в выбранном округе.
+@lru_cache(maxsize=None)
+def _city_kb(district_code: str) -> InlineKeyboardMarkup:
+    """Создаёт клавиатуру выбора города в округе.
+
+    Число округов фиксировано, поэтому кэш не ограничен.
 
     Args:
-        cb: Callback query от пользователя с выбранным округом.
+        district_code: Код федерального округа.
+
+    Returns:
+        Клавиатура с городами округа.
     """
-    district_code = cb.data.split(":")[-1]
-    district = next(d for d in DISTRICTS if d.code == district_code)
     kb = InlineKeyboardBuilder()
-    for city in district.cities:
+    for name, code in CITY_BUTTONS_BY_DISTRICT[district_code]:
         kb.button(
-            text=f"🏙️ {city.name}",
-            callback_data=f"settings:city:{district.code}:{city.code}"
+            text=f"🏙️ {name}",
+            callback_data=f"settings:city:{district_code}:{code}"
         )
     kb.button(text="⬅️ Назад", callback_data="settings:region")
     kb.adjust(1)
+    return kb.as_markup()
+
+
+@router.callback_query(F.data.startswith("settings:district:"))
+async def choose_city(cb: CallbackQuery) -> None:
+    """Открывает меню выбора города в выбранном округе.
+
+    Args:
+        cb: Callback query от пользователя с выбранным округом.
+    """
+    district_code = cb.data.split(":")[-1]
+    district = DISTRICTS_BY_CODE[district_code]
     await cb.message.edit_text(
         f"Округ: {district.name}. Выберите город:",
-        reply_markup=kb.as_markup()
+        reply_markup=_city_kb(district.code)
     )
     await cb.answer()
 
@@ -193,14 +256,11 @@ async def set_city(cb: CallbackQuery) -> None:
         cb: Callback query от пользователя с выбранным городом.
     """
     _, _, district_code, city_code = cb.data.split(":")
-    district = next(d for d in DISTRICTS if d.code == district_code)
-    city = next(c for c in district.cities if c.code == city_code)
-    async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == cb.from_user.id)
-        )
-        user.region_district = district.name
-        user.region_city = city.name
-        user.dest_code = city.dest
-        await session.commit()
-    await open_settings(cb)
+    district = DISTRICTS_BY_CODE[district_code]
+    city = CITIES_BY_KEY[(district_code, city_code)]
+    await _update_settings(
+        cb,
+        region_district=district.name,
+        region_city=city.name,
+        dest_code=city.dest,
+    )
@@ -6,14 +6,19 @@
 
 from __future__ import annotations
 
+from functools import lru_cache
+
 from aiogram import Router, F
 from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.base import async_session_factory
 from app.db.models import User, Article
+from app.services import user_cache
 
 router = Router()
 
@@ -32,9 +37,12 @@ def _main_menu_kb() -> InlineKeyboardBuilder:
     return kb
 
 
-def main_reply_kb():
+@lru_cache(maxsize=1)
+def main_reply_kb() -> ReplyKeyboardMarkup:
     """Создаёт постоянную клавиатуру главного меню.
 
+    Клавиатура статична, поэтому строится один раз и переиспользуется.
+
     Returns:
         Reply-клавиатура с основными разделами бота.
     """
@@ -46,21 +54,21 @@ def main_reply_kb():
     return kb.as_markup(resize_keyboard=True, is_persistent=True)
 
 
-async def _ensure_user(telegram_id: int) -> None:
+async def _ensure_user(session: AsyncSession, telegram_id: int) -> None:
     """Создаёт пользователя в БД, если его ещё нет.
 
+    Выполняет ``INSERT ... ON CONFLICT DO NOTHING`` в переданной сессии,
+    коммит остаётся за вызывающим кодом.
+
     Args:
+        session: Открытая сессия БД.
         telegram_id: ID пользователя в Telegram.
     """
-    async with async_session_factory() as session:
-        res = await session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
-        user = res.scalar_one_or_none()
-        if user is None:
-            user = User(telegram_id=telegram_id)
-            session.add(user)
-            await session.commit()
+    await session.execute(
+        pg_insert(User)
+        .values(telegram_id=telegram_id)
+        .on_conflict_do_nothing(index_elements=[User.telegram_id])
+    )
 
 
 def _info_text(
@@ -98,6 +106,42 @@ def _info_text(
     return "\n".join(lines)
 
 
+async def _menu_info(session: AsyncSession, telegram_id: int) -> str:
+    """Формирует текст главного меню для пользователя.
+
+    Настройки пользователя берутся из кэша; при промахе пользователь
+    при необходимости создаётся, а его настройки и число артикулов
+    читаются одним запросом с ``LEFT JOIN`` и ``COUNT``.
+
+    Args:
+        session: Открытая сессия БД.
+        telegram_id: ID пользователя в Telegram.
+
+    Returns:
+        HTML-форматированный текст главного меню.
+    """
+    user = user_cache.get(telegram_id)
+    if user is not None:
+        articles_count = await session.scalar(
+            select(func.count(Article.id)).where(Article.user_id == user.id)
+        )
+    else:
+        await _ensure_user(session, telegram_id)
+        *columns, articles_count = (await session.execute(
+            select(*user_cache.SNAPSHOT_COLUMNS, func.count(Article.id))
+            .outerjoin(Article, Article.user_id == User.id)
+            .where(User.telegram_id == telegram_id)
+            .group_by(User.id)
+        )).one()
+        user = user_cache.put(telegram_id, user_cache.UserSnapshot(*columns))
+    return _info_text(
+        auto_update_enabled=user.auto_update_enabled,
+        region=user.region_city or user.region_district or "",
+        device=user.device,
+        articles_count=articles_count,
+    )
+
+
 @router.message(CommandStart())
 async def cmd_start(message: Message) -> None:
     """Обработчик команды /start.
@@ -108,25 +152,13 @@ async def cmd_start(message: Message) -> None:
     Args:
         message: Входящее сообщение от пользователя.
     """
-    await _ensure_user(message.from_user.id)
     async with async_session_factory() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        articles_count = await session.scalar(
-            select(func.count(Article.id)).where(Article.user_id == user.id)
-        )
-        info = _info_text(
-            auto_update_enabled=user.auto_update_enabled,
-            region=user.region_city or user.region_district or "",
-            device=user.device,
-            articles_count=int(articles_count or 0),
-        )
+        info = await _menu_info(session, message.from_user.id)
+        await session.commit()
     await message.answer(info, reply_markup=main_reply_kb())
 
 
 @router.message(F.text.endswith("cancel"))
-@router.message(F.text.endswith("/cancel"))
 @router.message(Command("cancel"))
 async def cmd_cancel(message: Message) -> None:
     """Обработчик команды отмены текущей операции.
@@ -154,18 +186,8 @@ async def back_to_menu(cb_or_msg):
     if isinstance(cb_or_msg, CallbackQuery):
         cb = cb_or_msg
         async with async_session_factory() as session:
-            user = await session.scalar(
-                select(User).where(User.telegram_id == cb.from_user.id)
-            )
-            articles_count = await session.scalar(
-                select(func.count(Article.id)).where(Article.user_id == user.id)
-            )
-            info = _info_text(
-                auto_update_enabled=user.auto_update_enabled,
-                region=user.region_city or user.region_district or "",
-                device=user.device,
-                articles_count=int(articles_count or 0),
-            )
+            info = await _menu_info(session, cb.from_user.id)
+            await session.commit()
         try:
             await cb.message.edit_text(info)
         except Exception:
@@ -3,19 +3,34 @@
 from __future__ import annotations
 
 import asyncio
+import io
+import re
+from typing import Awaitable, Callable
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select
+from sqlalchemy import delete, not_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.base import async_session_factory
 from app.db.models import Tracking, Article, User
+from app.services.tracker import get_user_lock
 from app.services.wb_client import WBClient
 from app.states import AddTracking
 
 router = Router()
 
+# Таблица для str.translate: запятая работает как разделитель строк
+_COMMA_TO_NL = str.maketrans({",": "\n"})
+# Максимальная длина текста сообщения Telegram
+_MESSAGE_LIMIT = 4096
+# Регулярные выражения фильтров компилируются один раз при импорте
+_THRESHOLD_RE = re.compile(r"^\d{1,4}$")
+_TH_DIRECT_RE = re.compile(r"^th:(\d+):(\d+)$")
+
 
 async def _get_positions_for_phrases(
     client: WBClient,
@@ -23,8 +38,7 @@ async def _get_positions_for_phrases(
     sku: int,
     device: str,
     dest: int,
-    phrases: list[str],
-    semaphore: asyncio.Semaphore
+    phrases: list[str]
 ) -> list[tuple[str, int | None]]:
     """Получает позиции товара по списку фраз параллельно.
 
@@ -34,18 +48,18 @@ async def _get_positions_for_phrases(
         device: Тип устройства ('mobile' / 'desktop').
         dest: Код региона доставки.
         phrases: Список поисковых фраз.
-        semaphore: Семафор для ограничения конкуренции.
 
     Returns:
         Список кортежей (фраза, позиция). Позиция None, если не найдено.
     """
-    async def one(phrase: str) -> tuple[str, int | None]:
-        async with semaphore:
-            pos = await client.get_product_position(
-                sku=sku, query=phrase, device=device, dest=dest
-            )
-            return phrase, pos
-    return await asyncio.gather(*(one(p) for p in phrases))
+    async with asyncio.TaskGroup() as tg:
+        tasks = [
+            tg.create_task(client.get_product_position(
+                sku=sku, query=p, device=device, dest=dest
+            ))
+            for p in phrases
+        ]
+    return [(p, t.result()) for p, t in zip(phrases, tasks)]
 
 
 async def _render_trackings_for_article(message: Message, article_id: int) -> None:
@@ -56,13 +70,11 @@ async def _render_trackings_for_article(message: Message, article_id: int) -> No
         article_id: ID артикула в БД.
     """
     async with async_session_factory() as session:
-        trackings = list(
-            (await session.scalars(
-                select(Tracking)
-                .where(Tracking.article_id == article_id)
-                .order_by(Tracking.id.asc())
-            )).all()
-        )
+        trackings = (await session.scalars(
+            select(Tracking)
+            .where(Tracking.article_id == article_id)
+            .order_by(Tracking.id.asc())
+        )).all()
         kb = InlineKeyboardBuilder()
         for t in trackings:
             kb.button(
@@ -76,27 +88,38 @@ async def _render_trackings_for_article(message: Message, article_id: int) -> No
     await message.edit_text(text, reply_markup=kb.as_markup())
 
 
-@router.callback_query(F.data.startswith("tracking:list:"))
-async def list_trackings(cb: CallbackQuery) -> None:
+async def list_trackings(
+    cb: CallbackQuery,
+    article_id: int,
+    state: FSMContext,
+    wb_client: WBClient
+) -> None:
     """Открывает список фраз отслеживания для артикула.
 
     Args:
-        cb: Callback query с ID артикула.
+        cb: Callback query.
+        article_id: ID артикула в БД.
+        state: FSM-контекст (не используется).
+        wb_client: Общий клиент Wildberries (не используется).
     """
-    article_id = int(cb.data.split(":")[-1])
     await _render_trackings_for_article(cb.message, article_id)
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("tracking:add:"))
-async def ask_add_phrase(cb: CallbackQuery, state: FSMContext) -> None:
+async def ask_add_phrase(
+    cb: CallbackQuery,
+    article_id: int,
+    state: FSMContext,
+    wb_client: WBClient
+) -> None:
     """Запрашивает у пользователя ввод новых фраз.
 
     Args:
-        cb: Callback query с ID артикула.
+        cb: Callback query.
+        article_id: ID артикула в БД.
         state: FSM-контекст.
+        wb_client: Общий клиент Wildberries (не используется).
     """
-    article_id = int(cb.data.split(":")[-1])
     await state.set_state(AddTracking.waiting_for_phrase)
     await state.update_data(article_id=article_id)
     await cb.message.edit_text(
@@ -117,24 +140,71 @@ def _parse_bulk_phrases(text: str) -> list[tuple[str, int | None]]:
     Returns:
         Список кортежей (фраза, порог). Порог None, если не указан.
     """
-    raw = [part.strip() for line in text.splitlines() for part in line.split(",")]
     pairs: list[tuple[str, int | None]] = []
-    for item in raw:
+    # Запятые превращаются в переводы строк: один проход splitlines()
+    # вместо отдельного split(",") на каждую строку
+    for item in text.translate(_COMMA_TO_NL).splitlines():
+        item = item.strip()
         if not item:
             continue
-        if "=" in item:
-            phrase, th = item.split("=", 1)
-            phrase = phrase.strip()
+        phrase, sep, th = item.partition("=")
+        if sep:
             try:
                 threshold = int(th.strip())
             except ValueError:
                 threshold = None
-            pairs.append((phrase, threshold))
+            pairs.append((phrase.strip(), threshold))
         else:
             pairs.append((item, None))
     return pairs
 
 
+async def _insert_phrases(
+    session: AsyncSession,
+    *,
+    telegram_id: int,
+    article_id: int,
+    pairs: list[tuple[str, int | None]],
+    default_th: int
+) -> bool:
+    """Добавляет фразы к артикулу пользователя одним INSERT.
+
+    Дубликаты отбрасывает сама БД через ON CONFLICT DO NOTHING.
+
+    Args:
+        session: Открытая сессия БД.
+        telegram_id: ID владельца в Telegram.
+        article_id: ID артикула в БД.
+        pairs: Фразы с порогами; None означает порог по умолчанию.
+        default_th: Порог для фраз без явного порога.
+
+    Returns:
+        False, если артикул не найден или принадлежит другому пользователю.
+    """
+    owned = await session.scalar(
+        select(Article.id).join(User, Article.user_id == User.id).where(
+            Article.id == article_id,
+            User.telegram_id == telegram_id,
+        )
+    )
+    if owned is None:
+        return False
+    rows = [
+        {
+            "article_id": article_id,
+            "phrase": phrase,
+            "threshold_position": th if th is not None else default_th,
+        }
+        for phrase, th in pairs
+    ]
+    # Конфликт по uq_article_phrase. Строки передаются параметрами
+    # (executemany): текст запроса не зависит от числа фраз и
+    # переиспользуется кэшем подготовленных выражений
+    await session.execute(pg_insert(Tracking).on_conflict_do_nothing(), rows)
+    await session.commit()
+    return True
+
+
 @router.message(AddTracking.waiting_for_phrase, F.text & ~F.via_bot)
 async def handle_phrase_input(message: Message, state: FSMContext) -> None:
     """Обрабатывает ввод пользователем одной или нескольких фраз.
@@ -159,37 +229,20 @@ async def handle_phrase_input(message: Message, state: FSMContext) -> None:
     data = await state.get_data()
     article_id: int = int(data["article_id"])  # type: ignore[index]
     async with async_session_factory() as session:
-        article = await session.scalar(
-            select(Article).join(User, Article.user_id == User.id).where(
-                Article.id == article_id,
-                User.telegram_id == message.from_user.id,
-            )
+        added = await _insert_phrases(
+            session,
+            telegram_id=message.from_user.id,
+            article_id=article_id,
+            pairs=pairs,
+            default_th=20,
         )
-        if article is None:
-            await state.clear()
-            await message.answer("Артикул не найден или уже удалён.")
-            return
-        existing = set(
-            (await session.scalars(
-                select(Tracking.phrase).where(Tracking.article_id == article.id)
-            )).all()
-        )
-        for phrase, th in pairs:
-            if phrase in existing:
-                continue
-            session.add(
-                Tracking(
-                    article_id=article.id,
-                    phrase=phrase,
-                    threshold_position=th if th is not None else 20
-                )
-            )
-        await session.commit()
     await state.clear()
-    await message.answer("Фразы добавлены.")
+    await message.answer(
+        "Фразы добавлены." if added else "Артикул не найден или уже удалён."
+    )
 
 
-@router.message(AddTracking.waiting_for_default_threshold, F.text.regexp(r"^\d{1,4}$"))
+@router.message(AddTracking.waiting_for_default_threshold, F.text.regexp(_THRESHOLD_RE))
 async def set_default_threshold_for_bulk(message: Message, state: FSMContext) -> None:
     """Устанавливает общий порог для всех фраз без явно указанного порога.
 
@@ -202,93 +255,137 @@ async def set_default_threshold_for_bulk(message: Message, state: FSMContext) ->
     article_id: int = int(data["article_id"])  # type: ignore[index]
     pairs: list[tuple[str, int | None]] = data.get("pairs", [])  # type: ignore[assignment]
     async with async_session_factory() as session:
-        article = await session.scalar(
-            select(Article).join(User, Article.user_id == User.id).where(
-                Article.id == article_id,
-                User.telegram_id == message.from_user.id,
-            )
+        added = await _insert_phrases(
+            session,
+            telegram_id=message.from_user.id,
+            article_id=article_id,
+            pairs=pairs,
+            default_th=default_th,
         )
-        if article is None:
-            await state.clear()
-            await message.answer("Артикул не найден или уже удалён.")
-            return
-        existing = set(
-            (await session.scalars(
-                select(Tracking.phrase).where(Tracking.article_id == article.id)
-            )).all()
-        )
-        for phrase, th in pairs:
-            if phrase in existing:
-                continue
-            threshold = th if th is not None else default_th
-            session.add(
-                Tracking(
-                    article_id=article.id,
-                    phrase=phrase,
-                    threshold_position=threshold
-                )
-            )
-        await session.commit()
     await state.clear()
-    await message.answer("Фразы добавлены.")
+    await message.answer(
+        "Фразы добавлены." if added else "Артикул не найден или уже удалён."
+    )
 
 
-@router.callback_query(F.data.startswith("tracking:edit:"))
-async def edit_tracking(cb: CallbackQuery) -> None:
-    """Открывает меню редактирования конкретной фразы отслеживания.
+# Колонки фразы, нужные для меню редактирования (порядок как в
+# аргументах _render_tracking_menu)
+_TRACKING_MENU_COLUMNS = (
+    Tracking.article_id,
+    Tracking.phrase,
+    Tracking.threshold_position,
+    Tracking.enabled,
+)
+
+
+async def _render_tracking_menu(
+    cb: CallbackQuery,
+    tracking_id: int,
+    article_id: int,
+    phrase: str,
+    threshold: int,
+    enabled: bool
+) -> None:
+    """Показывает меню редактирования фразы по уже прочитанным значениям.
 
     Args:
-        cb: Callback query с ID фразы отслеживания.
+        cb: Callback query, сообщение которого редактируется.
+        tracking_id: ID фразы отслеживания.
+        article_id: ID артикула фразы.
+        phrase: Текст фразы.
+        threshold: Порог позиции.
+        enabled: Включена ли автопроверка.
     """
-    tracking_id = int(cb.data.split(":")[-1])
-    async with async_session_factory() as session:
-        tracking = await session.get(Tracking, tracking_id)
-        kb = InlineKeyboardBuilder()
-        kb.button(text="Вкл/Выкл", callback_data=f"tracking:toggle:{tracking.id}")
-        kb.button(text="Изм. порог", callback_data=f"tracking:th:{tracking.id}")
-        kb.button(text="Удалить", callback_data=f"tracking:del:{tracking.id}")
-        kb.button(text="Назад", callback_data=f"tracking:list:{tracking.article_id}")
-        kb.adjust(2, 2)
-        text = (
-            f"Фраза: {tracking.phrase}\n"
-            f"Порог: {tracking.threshold_position}\n"
-            f"Статус: {'Вкл' if tracking.enabled else 'Выкл'}"
-        )
+    kb = InlineKeyboardBuilder()
+    kb.button(text="Вкл/Выкл", callback_data=f"tracking:toggle:{tracking_id}")
+    kb.button(text="Изм. порог", callback_data=f"tracking:th:{tracking_id}")
+    kb.button(text="Удалить", callback_data=f"tracking:del:{tracking_id}")
+    kb.button(text="Назад", callback_data=f"tracking:list:{article_id}")
+    kb.adjust(2, 2)
+    text = (
+        f"Фраза: {phrase}\n"
+        f"Порог: {threshold}\n"
+        f"Статус: {'Вкл' if enabled else 'Выкл'}"
+    )
     await cb.message.edit_text(text, reply_markup=kb.as_markup())
     await cb.answer()
 
 
-@router.callback_query(F.data.startswith("tracking:toggle:"))
-async def toggle_tracking(cb: CallbackQuery) -> None:
+async def edit_tracking(
+    cb: CallbackQuery,
+    tracking_id: int,
+    state: FSMContext,
+    wb_client: WBClient
+) -> None:
+    """Открывает меню редактирования конкретной фразы отслеживания.
+
+    Args:
+        cb: Callback query.
+        tracking_id: ID фразы отслеживания.
+        state: FSM-контекст (не используется).
+        wb_client: Общий клиент Wildberries (не используется).
+    """
+    async with async_session_factory() as session:
+        row = (await session.execute(
+            select(*_TRACKING_MENU_COLUMNS).where(Tracking.id == tracking_id)
+        )).first()
+    if row is None:
+        await cb.answer("Не найдено", show_alert=True)
+        return
+    await _render_tracking_menu(cb, tracking_id, *row)
+
+
+async def toggle_tracking(
+    cb: CallbackQuery,
+    tracking_id: int,
+    state: FSMContext,
+    wb_client: WBClient
+) -> None:
     """Включает/выключает автопроверку фразы.
 
     Args:
-        cb: Callback query с ID фразы отслеживания.
+        cb: Callback query.
+        tracking_id: ID фразы отслеживания.
+        state: FSM-контекст (не используется).
+        wb_client: Общий клиент Wildberries (не используется).
     """
-    tracking_id = int(cb.data.split(":")[-1])
+    # Один UPDATE ... RETURNING вместо чтения, изменения и повторного
+    # чтения для перерисовки меню
     async with async_session_factory() as session:
-        tracking = await session.get(Tracking, tracking_id)
-        tracking.enabled = not tracking.enabled
+        row = (await session.execute(
+            update(Tracking)
+            .where(Tracking.id == tracking_id)
+            .values(enabled=not_(Tracking.enabled))
+            .returning(*_TRACKING_MENU_COLUMNS)
+        )).first()
+        if row is None:
+            await cb.answer("Не найдено", show_alert=True)
+            return
         await session.commit()
-    await edit_tracking(cb)
+    await _render_tracking_menu(cb, tracking_id, *row)
 
 
-@router.callback_query(F.data.startswith("tracking:th:"))
-async def ask_new_threshold(cb: CallbackQuery, state: FSMContext) -> None:
+async def ask_new_threshold(
+    cb: CallbackQuery,
+    tracking_id: int,
+    state: FSMContext,
+    wb_client: WBClient
+) -> None:
     """Запрашивает новый порог позиций для фразы.
 
     Args:
-        cb: Callback query с ID фразы отслеживания.
+        cb: Callback query.
+        tracking_id: ID фразы отслеживания.
         state: FSM-контекст.
+        wb_client: Общий клиент Wildberries (не используется).
     """
-    tracking_id = int(cb.data.split(":")[-1])
     await state.set_state(AddTracking.waiting_for_threshold)
     await state.update_data(tracking_id=tracking_id)
     await cb.message.edit_text(f"Введите новый порог для ID {tracking_id}:")
     await cb.answer()
 
 
-@router.message(AddTracking.waiting_for_threshold, F.text.regexp(r"^\d{1,4}$"))
+@router.message(AddTracking.waiting_for_threshold, F.text.regexp(_THRESHOLD_RE))
 async def set_threshold_on_specific(message: Message, state: FSMContext) -> None:
     """Устанавливает новый порог для конкретной фразы.
 
@@ -306,67 +403,116 @@ async def set_threshold_on_specific(message: Message, state: FSMContext) -> None
         )
         return
     async with async_session_factory() as session:
-        tracking = await session.get(Tracking, tracking_id)
-        if not tracking:
+        res = await session.execute(
+            update(Tracking)
+            .where(Tracking.id == tracking_id)
+            .values(threshold_position=value)
+        )
+        if res.rowcount == 0:
             await state.clear()
             await message.answer("Фраза не найдена.")
             return
-        tracking.threshold_position = value
         await session.commit()
     await state.clear()
     await message.answer("Порог обновлён.")
 
 
-@router.message(F.text.regexp(r"^th:\d+:\d+$"))
-async def set_threshold_direct(message: Message) -> None:
+@router.message(F.text.regexp(_TH_DIRECT_RE).as_("match"))
+async def set_threshold_direct(message: Message, match: re.Match[str]) -> None:
     """Устанавливает порог через прямую команду th:id:value.
 
     Args:
         message: Сообщение с командой вида 'th:123:15'.
+        match: Результат сопоставления с _TH_DIRECT_RE.
     """
-    _, tid, val = message.text.split(":")
-    tracking_id = int(tid)
-    value = int(val)
+    tracking_id = int(match[1])
+    value = int(match[2])
     async with async_session_factory() as session:
-        tracking = await session.get(Tracking, tracking_id)
-        if tracking is None:
+        res = await session.execute(
+            update(Tracking)
+            .where(Tracking.id == tracking_id)
+            .values(threshold_position=value)
+        )
+        if res.rowcount == 0:
             await message.answer("Не найдено")
             return
-        tracking.threshold_position = value
         await session.commit()
     await message.answer("Порог обновлён")
 
 
-@router.callback_query(F.data.startswith("tracking:del:"))
-async def delete_tracking(cb: CallbackQuery) -> None:
+async def delete_tracking(
+    cb: CallbackQuery,
+    tracking_id: int,
+    state: FSMContext,
+    wb_client: WBClient
+) -> None:
     """Удаляет фразу отслеживания из БД.
 
     Args:
-        cb: Callback query с ID фразы отслеживания.
+        cb: Callback query.
+        tracking_id: ID фразы отслеживания.
+        state: FSM-контекст (не используется).
+        wb_client: Общий клиент Wildberries (не используется).
     """
-    tracking_id = int(cb.data.split(":")[-1])
+    # Один DELETE ... RETURNING вместо загрузки объекта и отдельного DELETE
     async with async_session_factory() as session:
-        tracking = await session.get(Tracking, tracking_id)
-        article_id = tracking.article_id if tracking else None
-        if tracking:
-            await session.delete(tracking)
+        article_id = await session.scalar(
+            delete(Tracking)
+            .where(Tracking.id == tracking_id)
+            .returning(Tracking.article_id)
+        )
+        if article_id is not None:
             await session.commit()
     await cb.answer("Удалено")
-    if article_id:
+    if article_id is not None:
         await _render_trackings_for_article(cb.message, article_id)
 
 
-@router.callback_query(F.data.startswith("tracking:check:"))
-async def check_article(cb: CallbackQuery) -> None:
+def _result_pages(pairs: list[tuple[str, int | None]]) -> list[str]:
+    """Формирует текст результатов проверки, разбитый на сообщения.
+
+    Строки пишутся в один буфер; страница закрывается, когда следующая
+    строка не помещается в лимит длины сообщения Telegram.
+
+    Args:
+        pairs: Пары (фраза, позиция).
+
+    Returns:
+        Тексты сообщений; пустой список, если фраз нет.
+    """
+    pages: list[str] = []
+    buf = io.StringIO()
+    for phrase, pos in pairs:
+        line = f"{phrase}: {'—' if pos is None else pos}"
+        # tell() у StringIO — число уже записанных символов
+        if buf.tell() and buf.tell() + 1 + len(line) > _MESSAGE_LIMIT:
+            pages.append(buf.getvalue())
+            buf = io.StringIO()
+        if buf.tell():
+            buf.write("\n")
+        buf.write(line)
+    if buf.tell():
+        pages.append(buf.getvalue())
+    return pages
+
+
+async def check_article(
+    cb: CallbackQuery,
+    article_id: int,
+    state: FSMContext,
+    wb_client: WBClient
+) -> None:
     """Выполняет ручную проверку позиций товара по всем фразам.
 
     Args:
-        cb: Callback query с ID артикула.
+        cb: Callback query.
+        article_id: ID артикула в БД.
+        state: FSM-контекст (не используется).
+        wb_client: Общий клиент Wildberries из данных диспетчера.
     """
-    article_id = int(cb.data.split(":")[-1])
     async with async_session_factory() as session:
         row = await session.execute(
-            select(Article.sku, User.device, User.dest_code)
+            select(Article.sku, User.id, User.device, User.dest_code)
             .join(User, Article.user_id == User.id)
             .where(Article.id == article_id, User.telegram_id == cb.from_user.id)
         )
@@ -374,21 +520,59 @@ async def check_article(cb: CallbackQuery) -> None:
         if not res:
             await cb.answer("Не найдено", show_alert=True)
             return
-        sku, device, dest = res
-        phrases = list(
-            (await session.scalars(
-                select(Tracking.phrase).where(Tracking.article_id == article_id)
-            )).all()
-        )
-    async with WBClient() as client:
+        sku, user_id, device, dest = res
+        phrases = (await session.scalars(
+            select(Tracking.phrase).where(Tracking.article_id == article_id)
+        )).all()
+    # Не пересекается с плановой проверкой этого же пользователя
+    async with get_user_lock(user_id):
         pairs = await _get_positions_for_phrases(
-            client,
+            wb_client,
             sku=sku,
             device=device,
             dest=dest or -1257786,
-            phrases=phrases,
-            semaphore=asyncio.Semaphore(6)
+            phrases=phrases
         )
-    lines = [f"{phrase}: {pos if pos is not None else '—'}" for phrase, pos in pairs]
-    await cb.message.edit_text("\n".join(lines) if lines else "Нет фраз.")
+    pages = _result_pages(pairs) or ["Нет фраз."]
+    await cb.message.edit_text(pages[0])
+    for page in pages[1:]:
+        await cb.message.answer(page)
     await cb.answer()
+
+
+# Действия callback-данных вида "tracking:<действие>:<id>"
+_TRACKING_ACTIONS: dict[
+    str, Callable[[CallbackQuery, int, FSMContext, WBClient], Awaitable[None]]
+] = {
+    "list": list_trackings,
+    "add": ask_add_phrase,
+    "edit": edit_tracking,
+    "toggle": toggle_tracking,
+    "th": ask_new_threshold,
+    "del": delete_tracking,
+    "check": check_article,
+}
+
+
+@router.callback_query(F.data.startswith("tracking:"))
+async def tracking_callback(
+    cb: CallbackQuery,
+    state: FSMContext,
+    wb_client: WBClient
+) -> None:
+    """Единая точка входа для кнопок управления фразами.
+
+    Действие выбирается по второму сегменту callback-данных через словарь
+    вместо отдельного фильтра на каждое действие.
+
+    Args:
+        cb: Callback query вида "tracking:<действие>:<id>".
+        state: FSM-контекст.
+        wb_client: Общий клиент Wildberries из данных диспетчера.
+    """
+    action, _, arg = cb.data[len("tracking:"):].partition(":")
+    handler = _TRACKING_ACTIONS.get(action)
+    if handler is None or not arg.isdecimal():
+        await cb.answer()
+        return
+    await handler(cb, int(arg), state, wb_client)
@@ -9,6 +9,7 @@ from __future__ import annotations
 from typing import Optional
 
 from aiogram import Bot
+from apscheduler.executors.asyncio import AsyncIOExecutor
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from loguru import logger
 
@@ -37,14 +38,22 @@ async def setup_scheduler(bot: Bot) -> None:
         logger.info("Планировщик отключён в настройках")
         return
     if _scheduler is None:
-        _scheduler = AsyncIOScheduler()
+        # Затянувшийся прогон не должен пересекаться со следующим: один
+        # экземпляр задачи, пропущенные запуски схлопываются в один
+        _scheduler = AsyncIOScheduler(
+            executors={"default": AsyncIOExecutor()},
+            job_defaults={"coalesce": True, "max_instances": 1},
+        )
         _scheduler.add_job(
             run_hourly_tracking,
             "interval",
             minutes=10,
             kwargs={"bot": bot},
             id="tracking_10min",
-            replace_existing=True
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=60
         )
         _scheduler.start()
         logger.info("Планировщик запущен: задача отслеживания каждые 10 минут")
@@ -6,22 +6,51 @@
 
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Iterable
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Iterable
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramNetworkError
 from loguru import logger
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 import asyncio
+import time
+import weakref
 
+from app.config import settings
 from app.db.base import async_session_factory
 from app.db.models import Tracking, Article, User
 from app.services.wb_client import WBClient
 
 
+# Кэш позиций: пользователи с одинаковыми фразой, артикулом, устройством и
+# регионом получают один запрос к WB. TTL меньше интервала планировщика
+_POSITION_TTL_SECONDS = 300.0
+_POSITION_CACHE_MAXSIZE = 4096
+# Ключ -> (момент устаревания, задача запроса); задача общая и для
+# одновременных вызовов, и для повторных в пределах TTL
+_position_cache: dict[
+    tuple[int, str, str, int], tuple[float, asyncio.Task[int | None]]
+] = {}
+
+
+def _evict_positions(now: float) -> None:
+    """Освобождает место в кэше позиций.
+
+    Сначала удаляются устаревшие записи, затем самые старые по времени
+    добавления.
+
+    Args:
+        now: Текущее значение time.monotonic().
+    """
+    for key in [k for k, (exp, _) in _position_cache.items() if exp <= now]:
+        del _position_cache[key]
+    while len(_position_cache) >= _POSITION_CACHE_MAXSIZE:
+        del _position_cache[next(iter(_position_cache))]
+
+
 async def fetch_position_for_phrase(
     client: WBClient,
     sku: int,
@@ -31,6 +60,9 @@ async def fetch_position_for_phrase(
 ) -> int | None:
     """Запрашивает позицию товара по поисковой фразе.
 
+    Результат кэшируется на _POSITION_TTL_SECONDS по ключу
+    (артикул, фраза, устройство, регион). Неудачный запрос в кэше не остаётся.
+
     Args:
         client: Клиент Wildberries API.
         sku: Артикул товара.
@@ -41,13 +73,37 @@ async def fetch_position_for_phrase(
     Returns:
         Позиция товара (нумерация с 1) или None, если не найден.
     """
-    return await client.get_product_position(
-        sku=sku,
-        query=phrase,
-        device=device,
-        dest=dest
-    )
+    key = (sku, phrase.strip().lower(), device, dest)
+    now = time.monotonic()
+    cached = _position_cache.get(key)
+    if cached is None or cached[0] <= now:
+        if key not in _position_cache and len(_position_cache) >= _POSITION_CACHE_MAXSIZE:
+            _evict_positions(now)
+        task = asyncio.ensure_future(client.get_product_position(
+            sku=sku,
+            query=phrase,
+            device=device,
+            dest=dest
+        ))
+        cached = (now + _POSITION_TTL_SECONDS, task)
+        _position_cache[key] = cached
+    task = cached[1]
+    try:
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+    except Exception:
+        if _position_cache.get(key) is cached:
+            del _position_cache[key]
+        raise
+
 
+# Уведомления отправляются фоновыми воркерами из очереди, чтобы повторы и
+# задержки Telegram не тормозили проверку позиций
+_SEND_WORKERS = 4
+# Ограничение времени на отправку одной пачки сообщений пользователю
+_SEND_TIMEOUT_SECONDS = 30.0
+_send_queue: asyncio.Queue[tuple[int, list[str]]] | None = None
+_send_workers: list[asyncio.Task[None]] = []
 
 async def _safe_send(
     bot: Bot,
@@ -84,83 +140,366 @@ async def _safe_send(
         )
 
 
-async def process_user_trackings(
-    session: AsyncSession,
-    user: User,
-    bot: Bot
-) -> None:
-    """Обрабатывает отслеживание позиций для одного пользователя.
+async def _deliver(bot: Bot, chat_id: int, texts: list[str]) -> None:
+    """Отправляет сообщения одному пользователю по порядку.
 
-    Проверяет позиции всех артикулов пользователя по всем активным фразам.
-    Отправляет уведомления, если позиция превышает пороговое значение.
+    Отправка всей пачки ограничена _SEND_TIMEOUT_SECONDS, чтобы зависший
+    Telegram не занимал воркер бесконечно.
 
     Args:
-        session: Сессия базы данных.
-        user: Пользователь для обработки.
-        bot: Экземпляр Telegram бота для отправки уведомлений.
+        bot: Экземпляр Telegram бота.
+        chat_id: ID чата получателя.
+        texts: Тексты сообщений.
     """
-    if user.dest_code is None:
-        logger.debug(
-            f"Пропускаем пользователя {user.telegram_id}: регион не настроен"
-        )
+    async def send_all() -> None:
+        for text in texts:
+            await _safe_send(bot, chat_id, text)
+
+    try:
+        await asyncio.wait_for(send_all(), _SEND_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"Истекло время отправки уведомлений пользователю {chat_id}")
+
+
+async def _send_worker(bot: Bot, queue: asyncio.Queue[tuple[int, list[str]]]) -> None:
+    """Фоновый воркер: забирает пачки сообщений из очереди и отправляет их.
+
+    Args:
+        bot: Экземпляр Telegram бота.
+        queue: Очередь пачек (ID чата, тексты).
+    """
+    while True:
+        chat_id, texts = await queue.get()
+        try:
+            await _deliver(bot, chat_id, texts)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(f"Воркер отправки: ошибка для {chat_id}: {exc}")
+        finally:
+            queue.task_done()
+
+
+def start_send_workers(bot: Bot, count: int = _SEND_WORKERS) -> None:
+    """Создаёт очередь уведомлений и запускает воркеры отправки.
+
+    Повторный вызов ничего не делает.
+
+    Args:
+        bot: Экземпляр Telegram бота.
+        count: Количество воркеров.
+    """
+    global _send_queue
+    if _send_queue is not None:
         return
-    
-    result = await session.execute(
-        select(Article)
-        .where(Article.user_id == user.id)
-        .options(selectinload(Article.trackings))
+    _send_queue = asyncio.Queue()
+    _send_workers.extend(
+        asyncio.create_task(_send_worker(bot, _send_queue)) for _ in range(count)
     )
-    articles: list[Article] = list(result.scalars().all())
-    
-    if not articles:
+
+
+async def stop_send_workers(timeout: float = 10.0) -> None:
+    """Дожидается отправки очереди (не дольше timeout) и останавливает воркеры.
+
+    Args:
+        timeout: Максимальное время ожидания опустошения очереди в секундах.
+    """
+    global _send_queue
+    if _send_queue is None:
         return
-    
-    async with WBClient() as client:
-        for article in articles:
-            for tracking in list(article.trackings):
-                if not tracking.enabled:
-                    continue
-                
-                pos = await fetch_position_for_phrase(
-                    client,
-                    article.sku,
-                    tracking.phrase,
-                    user.device,
-                    user.dest_code
-                )
-                tracking.last_checked_at = datetime.utcnow()
-                tracking.last_position = pos
-                
-                # Отправляем уведомление, если позиция хуже порога
-                if pos is not None and pos > tracking.threshold_position:
-                    # Проверяем, что это новая позиция (чтобы не спамить)
-                    if (tracking.last_notified_position is None or 
-                        pos != tracking.last_notified_position):
-                        text = (
-                            f"Артикул {article.sku} опустился до позиции {pos} "
-                            f"по фразе «{tracking.phrase}».\n"
-                            f"Порог: {tracking.threshold_position}. "
-                            f"Устройство: {user.device}. "
-                            f"Регион: {user.region_city or user.region_district}."
-                        )
-                        await _safe_send(bot, user.telegram_id, text)
-                        tracking.last_notified_position = pos
-    
-    # Краткий статус после завершения проверки
+    try:
+        await asyncio.wait_for(_send_queue.join(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(
+            f"Не отправлено уведомлений при остановке: {_send_queue.qsize()}"
+        )
+    for task in _send_workers:
+        task.cancel()
+    await asyncio.gather(*_send_workers, return_exceptions=True)
+    _send_workers.clear()
+    _send_queue = None
+
+
+async def _notify(bot: Bot, chat_id: int, texts: list[str]) -> None:
+    """Ставит пачку сообщений в очередь отправки.
+
+    Если воркеры не запущены (например, при разовом запуске вне бота),
+    сообщения отправляются сразу.
+
+    Args:
+        bot: Экземпляр Telegram бота.
+        chat_id: ID чата получателя.
+        texts: Тексты сообщений в порядке отправки.
+    """
+    if _send_queue is None:
+        await _deliver(bot, chat_id, texts)
+    else:
+        _send_queue.put_nowait((chat_id, texts))
+
+
+# Блокировки проверок по ID пользователя в БД: ручная и плановая проверки
+# одного пользователя не запрашивают WB одновременно. Запись пропадает
+# сама, когда блокировку никто не держит и не ждёт
+_user_locks: weakref.WeakValueDictionary[int, asyncio.Lock] = (
+    weakref.WeakValueDictionary()
+)
+
+# Клиент Redis для блокировок между процессами webhook сервера; задаётся
+# use_redis_locks() только при нескольких процессах
+_redis: Any = None
+# Ключ и срок жизни блокировки прогона отслеживания: по истечении срока
+# блокировка упавшего процесса освобождается сама
+_TRACKING_LOCK_KEY = "wbpos:tracking"
+_TRACKING_LOCK_TIMEOUT = 30 * 60
+_USER_LOCK_TIMEOUT = 5 * 60
+
+
+def use_redis_locks(url: str) -> None:
+    """Включает блокировки в Redis, общие для всех процессов.
+
+    Args:
+        url: Адрес Redis (REDIS_URL).
+    """
+    global _redis
+    # Импорт здесь: пакет redis нужен только с REDIS_URL
+    from redis.asyncio import Redis
+    _redis = Redis.from_url(url)
+
+
+async def close_redis_locks() -> None:
+    """Закрывает клиент Redis для блокировок, если он был создан."""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+
+
+@asynccontextmanager
+async def get_user_lock(user_id: int) -> AsyncIterator[None]:
+    """Захватывает блокировку проверок позиций для пользователя.
+
+    Блокировка в памяти общая для проверок в одном процессе; с
+    use_redis_locks() дополнительно берётся блокировка в Redis, чтобы
+    проверки не пересекались и между процессами.
+
+    Args:
+        user_id: ID пользователя в БД.
+
+    Yields:
+        None, пока блокировка удерживается.
+    """
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    async with lock:
+        if _redis is None:
+            yield
+            return
+        async with _redis.lock(
+            f"wbpos:user:{user_id}", timeout=_USER_LOCK_TIMEOUT
+        ):
+            yield
+
+
+async def _bounded_position(
+    client: WBClient,
+    semaphore: asyncio.Semaphore,
+    sku: int,
+    phrase: str,
+    device: str,
+    dest: int
+) -> int | None:
+    """Запрашивает позицию товара под общим семафором.
+
+    Args:
+        client: Клиент Wildberries API.
+        semaphore: Семафор, ограничивающий число одновременных запросов.
+        sku: Артикул товара.
+        phrase: Поисковая фраза.
+        device: Тип устройства (pc/android/ios).
+        dest: Код региона Wildberries.
+
+    Returns:
+        Позиция товара (нумерация с 1) или None, если не найден.
+    """
+    async with semaphore:
+        return await fetch_position_for_phrase(client, sku, phrase, device, dest)
+
+
+def collect_user_trackings(user: User) -> list[tuple[Article, Tracking]]:
+    """Собирает активные отслеживания одного пользователя.
+
+    Артикулы и их фразы должны быть загружены заранее, причём загрузчик
+    фраз уже отфильтровал выключенные отслеживания.
+
+    Args:
+        user: Пользователь с загруженными артикулами и отслеживаниями.
+
+    Returns:
+        Пары (артикул, отслеживание) для всех активных фраз.
+    """
+    return [
+        (article, tracking)
+        for article in user.articles
+        for tracking in article.trackings
+    ]
+
+
+def apply_tracking_result(
+    user: User,
+    article: Article,
+    tracking: Tracking,
+    pos: int | None,
+    checked_at: datetime
+) -> tuple[dict[str, Any], str | None]:
+    """Готовит обновление строки отслеживания и текст уведомления.
+
+    ORM-объект не изменяется: возвращаемые значения записываются одним
+    пакетным UPDATE на весь тик.
+
+    Args:
+        user: Владелец отслеживания.
+        article: Артикул отслеживания.
+        tracking: Отслеживание, для которого получена позиция.
+        pos: Найденная позиция или None.
+        checked_at: Время проверки (UTC).
+
+    Returns:
+        Параметры UPDATE для строки отслеживания и текст уведомления
+        (None, если уведомлять не нужно).
+    """
+    notified = tracking.last_notified_position
+    text = None
+
+    # Уведомляем, если позиция хуже порога
+    if pos is not None and pos > tracking.threshold_position:
+        # Проверяем, что это новая позиция (чтобы не спамить)
+        if notified is None or pos != notified:
+            text = (
+                f"Артикул {article.sku} опустился до позиции {pos} "
+                f"по фразе «{tracking.phrase}».\n"
+                f"Порог: {tracking.threshold_position}. "
+                f"Устройство: {user.device}. "
+                f"Регион: {user.region_city or user.region_district}."
+            )
+            notified = pos
+
+    return {
+        "id": tracking.id,
+        "last_checked_at": checked_at,
+        "last_position": pos,
+        "last_notified_position": notified,
+    }, text
+
+
+def _status_text(user: User) -> str:
+    """Формирует краткий статус после завершения проверки.
+
+    Args:
+        user: Пользователь, которому отправляется статус.
+
+    Returns:
+        Текст статуса.
+    """
     region = user.region_city or user.region_district or "Не выбран"
     status = "Включено" if user.auto_update_enabled else "Отключено"
-    await _safe_send(
-        bot,
-        user.telegram_id,
-        text=f"🔁 Автообновление выполнилось. ⚙️ {user.device} | 🗺️ {region} | {status}"
+    return f"🔁 Автообновление выполнилось. ⚙️ {user.device} | 🗺️ {region} | {status}"
+
+
+# Размер пачки пользователей, читаемой из БД за раз при плановой проверке
+_USER_BATCH_SIZE = 100
+
+
+async def _process_users(
+    bot: Bot,
+    client: WBClient,
+    semaphore: asyncio.Semaphore,
+    users: Iterable[User],
+    checked_at: datetime
+) -> list[dict[str, Any]]:
+    """Проверяет позиции для пачки пользователей.
+
+    Запрашивает позиции всех активных фраз пачки одним gather, затем
+    вторым проходом готовит обновления и ставит уведомления в очередь.
+
+    Args:
+        bot: Экземпляр Telegram бота для отправки уведомлений.
+        client: Общий на тик клиент Wildberries API.
+        semaphore: Семафор, ограничивающий число одновременных запросов.
+        users: Пользователи с загруженными артикулами и активными фразами.
+        checked_at: Время проверки (UTC).
+
+    Returns:
+        Параметры UPDATE для проверенных отслеживаний.
+    """
+    # Пользователи без артикулов не получают ни проверок, ни сообщений
+    per_user = [
+        (user, collect_user_trackings(user))
+        for user in users
+        if user.articles
+    ]
+
+    async def user_positions(
+        user: User,
+        pairs: list[tuple[Article, Tracking]]
+    ) -> list[int | None | BaseException]:
+        # Пока идёт плановая проверка пользователя, его ручная проверка ждёт
+        async with get_user_lock(user.id):
+            return await asyncio.gather(
+                *(
+                    _bounded_position(
+                        client, semaphore, article.sku, tracking.phrase,
+                        user.device, user.dest_code
+                    )
+                    for article, tracking in pairs
+                ),
+                return_exceptions=True
+            )
+
+    # Сбой одного пользователя (например, блокировки) не прерывает пачку
+    results = await asyncio.gather(
+        *(user_positions(user, pairs) for user, pairs in per_user),
+        return_exceptions=True
     )
 
+    updates: list[dict[str, Any]] = []
+    for (user, pairs), positions in zip(per_user, results):
+        if isinstance(positions, BaseException):
+            logger.warning(
+                f"Отслеживание для пользователя {user.telegram_id} не удалось: {positions}"
+            )
+            continue
+        texts: list[str] = []
+        for (article, tracking), pos in zip(pairs, positions):
+            if isinstance(pos, BaseException):
+                logger.warning(
+                    f"Позиция {article.sku} «{tracking.phrase}» не получена: {pos}"
+                )
+                continue
+            values, text = apply_tracking_result(
+                user, article, tracking, pos, checked_at
+            )
+            updates.append(values)
+            if text is not None:
+                texts.append(text)
+        # Статус отправляется только вместе с уведомлениями, иначе каждый
+        # тик слал бы всем пользователям одинаковое сообщение
+        if texts or settings.always_send_status:
+            texts.append(_status_text(user))
+            # Уведомления и статус уходят одной пачкой, по порядку
+            await _notify(bot, user.telegram_id, texts)
+    return updates
+
 
 async def run_hourly_tracking(bot: Bot) -> None:
     """Запускает задачу отслеживания для всех пользователей.
 
-    Выполняется планировщиком каждые 10 минут. Проверяет позиции товаров
-    для всех пользователей с включённым автообновлением.
+    Выполняется планировщиком каждые 10 минут и по внешнему cron. С
+    use_redis_locks() прогон защищён блокировкой в Redis: если он уже
+    идёт в другом процессе, вызов завершается сразу. Пользователи с включённым
+    автообновлением читаются потоком пачками по _USER_BATCH_SIZE вместе с
+    активными фразами; позиции каждой пачки запрашиваются через общий
+    WBClient (не больше ``settings.wb_concurrency`` запросов одновременно),
+    результаты пишутся одним пакетным UPDATE на пачку, каждый в своей
+    транзакции.
 
     Args:
         bot: Экземпляр Telegram бота для отправки уведомлений.
@@ -169,16 +508,67 @@ async def run_hourly_tracking(bot: Bot) -> None:
         >>> await run_hourly_tracking(bot)  # doctest: +SKIP
         # Отслеживание выполнено для всех пользователей
     """
+    if _redis is None:
+        await _track_all_users(bot)
+        return
+    from redis.exceptions import LockError
+    lock = _redis.lock(_TRACKING_LOCK_KEY, timeout=_TRACKING_LOCK_TIMEOUT)
+    if not await lock.acquire(blocking=False):
+        logger.info("Отслеживание уже выполняется в другом процессе")
+        return
+    try:
+        await _track_all_users(bot)
+    finally:
+        # Блокировка могла истечь при очень долгом прогоне
+        with suppress(LockError):
+            await lock.release()
+
+
+async def _track_all_users(bot: Bot) -> None:
+    """Проверяет позиции всех пользователей с автообновлением.
+
+    Args:
+        bot: Экземпляр Telegram бота для отправки уведомлений.
+    """
     logger.info("Запуск задачи планового отслеживания")
-    async with async_session_factory() as session:
-        users = list((await session.execute(select(User))).scalars().all())
-        for user in users:
-            if not user.auto_update_enabled:
-                continue
-            try:
-                await process_user_trackings(session, user, bot)
-            except Exception as exc:  # noqa: BLE001
-                logger.warning(
-                    f"Отслеживание для пользователя {user.telegram_id} не удалось: {exc}"
+    # Одна отметка времени на весь тик. Колонка last_checked_at хранит
+    # UTC без часового пояса (timestamp without time zone), поэтому
+    # tzinfo снимается: asyncpg не принимает aware-значение для неё
+    checked_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    semaphore = asyncio.Semaphore(settings.wb_concurrency)
+    async with async_session_factory() as session, WBClient() as client:
+        # Пользователи с автообновлением и регионом вместе с артикулами и
+        # активными фразами; yield_per держит в памяти одну пачку, а
+        # selectinload подгружает связи сразу для всей пачки
+        result = await session.stream_scalars(
+            select(User)
+            .where(
+                User.auto_update_enabled.is_(True),
+                User.dest_code.is_not(None),
+            )
+            .options(
+                selectinload(User.articles).selectinload(
+                    Article.trackings.and_(Tracking.enabled.is_(True))
                 )
-        await session.commit()
+            )
+            .execution_options(yield_per=_USER_BATCH_SIZE)
+        )
+        async for users in result.partitions():
+            updates = await _process_users(
+                bot, client, semaphore, users, checked_at
+            )
+            if updates:
+                # Результаты пачки пишутся в отдельной короткой транзакции:
+                # блокировки строк не держатся, пока идут запросы к WB для
+                # следующих пачек, а сбой позже не откатывает уже записанное
+                async with async_session_factory() as write_session:
+                    try:
+                        await write_session.execute(update(Tracking), updates)
+                        await write_session.commit()
+                    except Exception as exc:  # noqa: BLE001
+                        # Например, фразу удалили во время прогона; пачка
+                        # пропускается, следующие обрабатываются дальше
+                        await write_session.rollback()
+                        logger.warning(
+                            f"Не удалось сохранить результаты пачки: {exc}"
+                        )
@@ -0,0 +1,191 @@
+"""Кэш пользователей в памяти процесса.
+
+Хранит снимки строк ``User`` по Telegram ID, чтобы обработчики кнопок не
+ходили в БД за пользователем на каждое нажатие. Любой код, изменяющий
+пользователя, обязан вызвать :func:`invalidate`.
+
+Инвалидация действует только в своём процессе, поэтому при нескольких
+процессах webhook сервера кэш отключается через :func:`disable`.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import User
+
+# Максимальное число пользователей в кэше
+_MAXSIZE = 10_000
+# Время жизни записи в секундах
+_TTL_SECONDS = 60.0
+
+
+class UserSnapshot(NamedTuple):
+    """Неизменяемый снимок полей пользователя, нужных обработчикам.
+
+    Attributes:
+        id: ID пользователя в БД.
+        device: Тип устройства для поиска.
+        dest_code: Код региона доставки.
+        auto_update_enabled: Флаг автообновления позиций.
+        region_city: Выбранный город.
+        region_district: Выбранный федеральный округ.
+    """
+
+    id: int
+    device: str
+    dest_code: Optional[int]
+    auto_update_enabled: bool
+    region_city: Optional[str]
+    region_district: Optional[str]
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        """Создаёт снимок из ORM-объекта пользователя.
+
+        Args:
+            user: Объект пользователя из БД.
+
+        Returns:
+            Снимок пользователя.
+        """
+        return cls(
+            id=user.id,
+            device=user.device,
+            dest_code=user.dest_code,
+            auto_update_enabled=user.auto_update_enabled,
+            region_city=user.region_city,
+            region_district=user.region_district,
+        )
+
+
+# Колонки User в порядке полей UserSnapshot: select(*SNAPSHOT_COLUMNS)
+# возвращает строки, из которых снимок собирается без ORM-объекта
+SNAPSHOT_COLUMNS = tuple(getattr(User, name) for name in UserSnapshot._fields)
+
+_cache: dict[int, tuple[UserSnapshot, float]] = {}
+_enabled = True
+
+
+def disable() -> None:
+    """Отключает кэш: снимки больше не сохраняются, get всегда промах."""
+    global _enabled
+    _enabled = False
+    _cache.clear()
+
+
+def get(telegram_id: int) -> Optional[UserSnapshot]:
+    """Возвращает снимок пользователя из кэша.
+
+    Args:
+        telegram_id: ID пользователя в Telegram.
+
+    Returns:
+        Снимок пользователя или None, если записи нет или она устарела.
+    """
+    cached = _cache.get(telegram_id)
+    if cached is None:
+        return None
+    if cached[1] <= time.monotonic():
+        _cache.pop(telegram_id, None)
+        return None
+    return cached[0]
+
+
+def put(telegram_id: int, user: User | UserSnapshot) -> UserSnapshot:
+    """Кладёт снимок пользователя в кэш.
+
+    При переполнении сначала удаляются устаревшие записи, затем самые
+    старые по времени добавления.
+
+    Args:
+        telegram_id: ID пользователя в Telegram.
+        user: Объект пользователя из БД или готовый снимок.
+
+    Returns:
+        Сохранённый снимок пользователя (при отключённом кэше он только
+        возвращается).
+    """
+    snapshot = (
+        user if isinstance(user, UserSnapshot) else UserSnapshot.from_user(user)
+    )
+    if not _enabled:
+        return snapshot
+    now = time.monotonic()
+    if telegram_id not in _cache and len(_cache) >= _MAXSIZE:
+        for key in [k for k, (_, exp) in _cache.items() if exp <= now]:
+            del _cache[key]
+        while len(_cache) >= _MAXSIZE:
+            del _cache[next(iter(_cache))]
+    _cache[telegram_id] = (snapshot, now + _TTL_SECONDS)
+    return snapshot
+
+
+def invalidate(telegram_id: int) -> None:
+    """Удаляет пользователя из кэша после изменения его данных.
+
+    Args:
+        telegram_id: ID пользователя в Telegram.
+    """
+    _cache.pop(telegram_id, None)
+
+
+async def get_user(session: AsyncSession, telegram_id: int) -> Optional[UserSnapshot]:
+    """Возвращает пользователя из кэша, при промахе читает его из БД.
+
+    При промахе читаются только колонки снимка, без ORM-объекта. Сессия
+    не берёт соединение из пула, пока по ней не выполнен запрос, поэтому
+    при попадании в кэш обращения к БД нет.
+
+    Args:
+        session: Открытая сессия БД.
+        telegram_id: ID пользователя в Telegram.
+
+    Returns:
+        Снимок пользователя или None, если пользователя нет в БД.
+    """
+    cached = get(telegram_id)
+    if cached is not None:
+        return cached
+    row = (await session.execute(
+        select(*SNAPSHOT_COLUMNS).where(User.telegram_id == telegram_id)
+    )).first()
+    if row is None:
+        return None
+    return put(telegram_id, UserSnapshot(*row))
+
+
+async def ensure_user(session: AsyncSession, telegram_id: int) -> UserSnapshot:
+    """Получает или создаёт пользователя по Telegram ID.
+
+    Сначала смотрит в кэш пользователей; при промахе выполняет
+    ``INSERT ... ON CONFLICT DO UPDATE ... RETURNING`` в переданной
+    сессии: пустое обновление нужно, чтобы RETURNING вернул и уже
+    существующую строку. Коммит остаётся за вызывающим кодом.
+
+    Args:
+        session: Открытая сессия БД.
+        telegram_id: ID пользователя в Telegram.
+
+    Returns:
+        Снимок пользователя.
+    """
+    cached = get(telegram_id)
+    if cached is not None:
+        return cached
+    stmt = (
+        pg_insert(User)
+        .values(telegram_id=telegram_id)
+        .on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={"telegram_id": telegram_id},
+        )
+        .returning(*SNAPSHOT_COLUMNS)
+    )
+    row = (await session.execute(stmt)).one()
+    return put(telegram_id, UserSnapshot(*row))
@@ -7,18 +7,439 @@
 from __future__ import annotations
 
 import asyncio
+import random
+import re
+import sys
 import time
-from typing import Any, Optional, Tuple, Callable
+from collections import OrderedDict, deque
+from functools import lru_cache
+from types import MappingProxyType
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    Mapping,
+    NamedTuple,
+    Optional,
+    TypeVar,
+)
 
 import aiohttp
-from aiohttp import ClientConnectorError
+import orjson
+from aiohttp import (
+    ClientConnectorError,
+    ClientPayloadError,
+    ServerDisconnectedError,
+)
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import AsyncResolver, ThreadedResolver
 from loguru import logger
 
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+_T = TypeVar("_T")
+
 # URL эндпоинтов API Wildberries
 WB_SEARCH_URL = "https://search.wb.ru/exactmatch/ru/common/v5/search"
 WB_CARD_URL = "https://card.wb.ru/cards/detail"
 
 
+# Не больше стольких поисковых запросов к WB в секунду на процесс
+WB_SEARCH_RATE = 10
+# Не больше стольких одновременных запросов к хостам поиска и карточек WB
+# на процесс — независимо от лимитов коннектора
+WB_SEARCH_CONCURRENCY = 8
+WB_CARD_CONCURRENCY = 16
+
+# Верхняя граница задержки между повторами запроса
+_RETRY_CAP_SECONDS = 2.0
+# Верхняя граница ожидания по заголовку Retry-After
+_RETRY_AFTER_MAX_SECONDS = 10.0
+# HTTP статусы временных ошибок, при которых запрос повторяется
+_RETRIABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Время жизни превью после успешного ответа API карточек
+_PREVIEW_TTL_SECONDS = 600.0
+# Время жизни превью после сбоя и случайная добавка к нему: сбои быстро
+# перепроверяются, а разброс не даёт всем записям истечь одновременно
+_PREVIEW_NEGATIVE_TTL_SECONDS = 30.0
+_PREVIEW_NEGATIVE_JITTER_SECONDS = 10.0
+
+# Сырые страницы поиска переиспользуются столько секунд: артикулы одной
+# фразы, проверяемые подряд, не запрашивают одну и ту же выдачу повторно
+_SEARCH_PAGE_TTL_SECONDS = 30.0
+# Размер кэша страниц поиска: тело страницы — сотни килобайт
+_SEARCH_PAGE_CACHE_MAXSIZE = 128
+
+# Размеры картинок товара в порядке предпочтения
+_IMAGE_SIZES = ("big", "tm", "small")
+# Картинки крупнее этого размера не загружаются; читаются кусками по
+# _IMAGE_CHUNK_SIZE байт
+_IMAGE_MAX_BYTES = 3_000_000
+_IMAGE_CHUNK_SIZE = 65536
+
+
+class ProductPreview(NamedTuple):
+    """Превью товара из API карточек.
+
+    Attributes:
+        name: Название товара или None, если его не удалось получить.
+        image_url: URL картинки товара.
+        page_url: URL страницы товара.
+        ok: True, если API ответило 200 и ответ разобран; False при сбое
+            (тогда название неизвестно, и можно показать заглушку).
+    """
+
+    name: Optional[str]
+    image_url: str
+    page_url: str
+    ok: bool
+
+
+class _RateLimiter:
+    """Ограничитель частоты: не больше rate входов за period секунд.
+
+    Скользящее окно по отметкам времени; ожидающие проходят по очереди.
+
+    Example:
+        >>> limiter = _RateLimiter(10, 1.0)
+        >>> async with limiter:  # doctest: +SKIP
+        ...     await session.get(url)
+    """
+
+    def __init__(self, rate: int, period: float = 1.0) -> None:
+        """Создаёт ограничитель.
+
+        Args:
+            rate: Допустимое число входов за период.
+            period: Длина периода в секундах.
+        """
+        self._rate = rate
+        self._period = period
+        self._stamps: deque[float] = deque()
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> None:
+        """Ждёт, пока в текущем окне освободится место."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._stamps and now - self._stamps[0] >= self._period:
+                    self._stamps.popleft()
+                if len(self._stamps) < self._rate:
+                    self._stamps.append(now)
+                    return
+                await asyncio.sleep(self._period - (now - self._stamps[0]))
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
+        """Ничего не освобождает: лимит считается по моменту входа."""
+
+
+# Общие на процесс HTTP сессии: все экземпляры WBClient (обработчики и
+# плановая проверка) используют одни пулы keep-alive соединений. Для API
+# (search/card) и CDN картинок пулы раздельные, чтобы медленные загрузки
+# изображений не занимали соединения поисковых запросов
+_POOL_API = "api"
+_POOL_IMAGES = "images"
+_shared_sessions: dict[str, aiohttp.ClientSession] = {}
+
+
+# Семафоры одновременных запросов по хостам WB, общие для всех клиентов
+_host_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+def _host_semaphore(url: str, limit: int) -> asyncio.Semaphore:
+    """Возвращает семафор одновременных запросов к хосту URL.
+
+    Семафор создаётся лениво, при первом запросе из работающего цикла
+    событий, и дальше общий для всех экземпляров WBClient.
+
+    Args:
+        url: URL эндпоинта; семафор выбирается по его хосту.
+        limit: Допустимое число одновременных запросов к хосту.
+
+    Returns:
+        Семафор хоста.
+    """
+    host = url.split("/", 3)[2]
+    sem = _host_semaphores.get(host)
+    if sem is None:
+        sem = _host_semaphores[host] = asyncio.Semaphore(limit)
+    return sem
+
+
+# Ограничитель частоты поиска, общий для всех клиентов процесса
+_search_limiter: Optional[_RateLimiter] = None
+
+
+def _get_search_limiter() -> _RateLimiter:
+    """Возвращает общий на процесс ограничитель частоты поисковых запросов.
+
+    Создаётся лениво, при первом запросе из работающего цикла событий.
+    Общий для обработчиков и плановой проверки: её WBClient создаётся
+    заново на каждый тик, но не получает собственную квоту.
+
+    Returns:
+        Ограничитель WB_SEARCH_RATE запросов в секунду.
+    """
+    global _search_limiter
+    if _search_limiter is None:
+        _search_limiter = _RateLimiter(WB_SEARCH_RATE, 1.0)
+    return _search_limiter
+
+
+def _make_resolver() -> AbstractResolver:
+    """Создаёт DNS резолвер для коннектора.
+
+    c-ares (aiodns) резолвит асинхронно, без пула потоков под getaddrinfo.
+    На Windows aiodns не работает с ProactorEventLoop, а без установленного
+    aiodns AsyncResolver недоступен — в этих случаях используется
+    стандартный ThreadedResolver.
+
+    Returns:
+        Резолвер для aiohttp.TCPConnector.
+    """
+    if sys.platform != "win32":
+        try:
+            import aiodns  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            return AsyncResolver()
+    return ThreadedResolver()
+
+
+def _get_shared_session(pool: str = _POOL_API) -> aiohttp.ClientSession:
+    """Возвращает общую HTTP сессию пула, создавая её при первом обращении.
+
+    Создание синхронное, поэтому между проверкой и присваиванием нет точки
+    переключения и две сессии одного пула одновременно не появятся.
+
+    Общее число соединений не ограничено (limit=0): реальный потолок
+    параллелизма задают ограничитель частоты поиска, семафоры вызывающего
+    кода и limit_per_host=64 на каждый хост WB.
+
+    Args:
+        pool: Имя пула (_POOL_API или _POOL_IMAGES).
+
+    Returns:
+        Активная aiohttp сессия.
+    """
+    session = _shared_sessions.get(pool)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            resolver=_make_resolver(),
+            limit=0,
+            limit_per_host=64,
+            use_dns_cache=True,
+            ttl_dns_cache=600,
+            # Сессия живёт всё время работы процесса: держим соединения
+            # дольше дефолтных 15 с
+            keepalive_timeout=75,
+            enable_cleanup_closed=True
+        )
+        # Таймаут побольше для API; картинки передают свой, короткий
+        timeout = aiohttp.ClientTimeout(total=8)
+        # trust_env=True позволит использовать системные прокси (HTTPS_PROXY)
+        session = _shared_sessions[pool] = aiohttp.ClientSession(
+            timeout=timeout,
+            connector=connector,
+            trust_env=True
+        )
+    return session
+
+
+async def close_shared_session() -> None:
+    """Закрывает общие HTTP сессии при остановке приложения.
+
+    Example:
+        >>> await close_shared_session()  # doctest: +SKIP
+    """
+    sessions = list(_shared_sessions.values())
+    _shared_sessions.clear()
+    for session in sessions:
+        if not session.closed:
+            await session.close()
+
+
+def _decorrelated_jitter(base_delay: float, prev_sleep: float) -> float:
+    """Возвращает следующую задержку повтора по схеме «decorrelated jitter».
+
+    Args:
+        base_delay: Минимальная задержка в секундах.
+        prev_sleep: Предыдущая задержка в секундах.
+
+    Returns:
+        Случайная задержка от base_delay до утроенной предыдущей, но не
+        больше _RETRY_CAP_SECONDS.
+    """
+    return min(
+        _RETRY_CAP_SECONDS,
+        random.uniform(base_delay, max(base_delay, prev_sleep * 3))
+    )
+
+
+def _retry_after(resp: aiohttp.ClientResponse) -> Optional[float]:
+    """Извлекает задержку из заголовка Retry-After ответа.
+
+    Args:
+        resp: Ответ с временной ошибкой.
+
+    Returns:
+        Задержка в секундах (не больше _RETRY_AFTER_MAX_SECONDS) или None,
+        если заголовка нет или он не в секундах.
+    """
+    value = resp.headers.get("Retry-After")
+    if value is None or not value.isdecimal():
+        return None
+    return min(float(value), _RETRY_AFTER_MAX_SECONDS)
+
+
+class _RetriableStatus(Exception):
+    """Ответ WB с временной ошибкой, после которой запрос стоит повторить.
+
+    Attributes:
+        status: HTTP статус ответа.
+        retry_after: Задержка из заголовка Retry-After или None.
+    """
+
+    def __init__(self, status: int, retry_after: Optional[float]) -> None:
+        """Создаёт исключение по статусу ответа.
+
+        Args:
+            status: HTTP статус ответа.
+            retry_after: Задержка из заголовка Retry-After или None.
+        """
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _raise_for_retriable(resp: aiohttp.ClientResponse) -> None:
+    """Бросает _RetriableStatus, если статус ответа из _RETRIABLE_STATUSES.
+
+    Args:
+        resp: Ответ WB.
+
+    Raises:
+        _RetriableStatus: Временная ошибка (перегрузка, 5xx).
+    """
+    if resp.status in _RETRIABLE_STATUSES:
+        raise _RetriableStatus(resp.status, _retry_after(resp))
+
+
+# Ошибки, после которых запрос повторяется: сетевые сбои, обрыв тела
+# ответа и временные ошибки WB
+_RETRIABLE_ERRORS = (
+    asyncio.TimeoutError,
+    ClientConnectorError,
+    ClientPayloadError,
+    ServerDisconnectedError,
+    _RetriableStatus,
+)
+
+
+def _parse_search_products(body: bytes) -> Optional[list[dict[str, Any]]]:
+    """Разбирает страницу поиска WB и извлекает список товаров.
+
+    Args:
+        body: Сырое тело ответа поиска.
+
+    Returns:
+        Список товаров или None, если в ответе нет списка товаров.
+    """
+    data: dict[str, Any] = orjson.loads(body)
+    products = data.get("data", {}).get("products")
+    return products if isinstance(products, list) else None
+
+
+class _TTLCache(Generic[_K, _V]):
+    """Ограниченный кэш с временем жизни записей и вытеснением LRU.
+
+    При переполнении вытесняется запись, к которой дольше всего не
+    обращались. Устаревшие записи удаляются при обращении к ним и
+    периодической чисткой не чаще раза в sweep_interval секунд.
+
+    Example:
+        >>> cache = _TTLCache(maxsize=2, ttl=60.0)
+        >>> cache.set("a", 1)
+        >>> cache.get("a")
+        1
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        *,
+        sweep_interval: float = 30.0
+    ) -> None:
+        """Создаёт кэш.
+
+        Args:
+            maxsize: Максимальное число записей.
+            ttl: Время жизни записи по умолчанию в секундах.
+            sweep_interval: Минимальный интервал между чистками в секундах.
+        """
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._sweep_interval = sweep_interval
+        self._data: OrderedDict[_K, tuple[_V, float]] = OrderedDict()
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def __len__(self) -> int:
+        """Возвращает число записей, включая ещё не удалённые устаревшие."""
+        return len(self._data)
+
+    def get(self, key: _K) -> Optional[_V]:
+        """Возвращает значение по ключу.
+
+        Args:
+            key: Ключ записи.
+
+        Returns:
+            Значение или None, если записи нет или она устарела.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: _K, value: _V, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение.
+
+        Args:
+            key: Ключ записи.
+            value: Значение.
+            ttl: Время жизни записи в секундах; по умолчанию — заданное
+                при создании кэша.
+        """
+        now = time.monotonic()
+        self._maybe_sweep(now)
+        self._data[key] = (value, now + (self._ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def _maybe_sweep(self, now: float) -> None:
+        """Удаляет устаревшие записи, если с прошлой чистки прошло достаточно.
+
+        Args:
+            now: Текущее значение time.monotonic().
+        """
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self._sweep_interval
+        for key in [k for k, (_, exp) in self._data.items() if exp <= now]:
+            del self._data[key]
+
+
 class WBClient:
     """Клиент для работы с публичными эндпоинтами Wildberries.
 
@@ -27,11 +448,18 @@ class WBClient:
     повторные попытки при сбоях сети.
 
     Attributes:
-        _session: Асинхронная HTTP сессия aiohttp.
-        _preview_cache: Кэш превью товаров (название, URL картинки, URL страницы).
-        _image_cache: Кэш загруженных изображений.
-        _image_negative_cache: Кэш неудачных попыток загрузки изображений.
-        _cache_ttl_seconds: Время жизни кэша в секундах (по умолчанию 600).
+        _preview_cache: Кэш превью товаров по (sku, device, dest): 5000
+            записей, 10 минут после успешного ответа и 30–40 секунд
+            после сбоя.
+        _image_cache: Кэш загруженных изображений: 512 записей (байты
+            картинок крупные), 15 минут.
+        _image_negative_cache: Кэш неудачных попыток загрузки изображений:
+            10000 записей, 5 минут.
+        _search_cache: Кэш сырых страниц поиска по (запрос, dest, appType,
+            страница): 128 записей, 30 секунд.
+        _inflight: Выполняющиеся загрузки по ключу: одновременные запросы
+            одного ключа ждут одну и ту же задачу.
+        _waiters: Число ожидающих каждой загрузки из _inflight.
 
     Example:
         >>> async with WBClient() as client:  # doctest: +SKIP
@@ -43,11 +471,16 @@ class WBClient:
 
     def __init__(self) -> None:
         """Инициализирует клиент Wildberries с пустыми кэшами."""
-        self._session: Optional[aiohttp.ClientSession] = None
-        self._preview_cache: dict[int, tuple[Optional[str], str, str, float]] = {}
-        self._image_cache: dict[int, tuple[bytes, float]] = {}
-        self._image_negative_cache: dict[int, float] = {}
-        self._cache_ttl_seconds: float = 600.0
+        self._preview_cache: _TTLCache[
+            tuple[int, str, int], ProductPreview
+        ] = _TTLCache(5000, _PREVIEW_TTL_SECONDS)
+        self._image_cache: _TTLCache[int, bytes] = _TTLCache(512, 900.0)
+        self._image_negative_cache: _TTLCache[int, bool] = _TTLCache(10_000, 300.0)
+        self._search_cache: _TTLCache[tuple[str, int, int, int], bytes] = _TTLCache(
+            _SEARCH_PAGE_CACHE_MAXSIZE, _SEARCH_PAGE_TTL_SECONDS
+        )
+        self._inflight: dict[Hashable, asyncio.Task[Any]] = {}
+        self._waiters: dict[Hashable, int] = {}
 
     async def __aenter__(self) -> "WBClient":
         """Вход в контекстный менеджер."""
@@ -55,69 +488,116 @@ class WBClient:
         return self
 
     async def __aexit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
-        """Выход из контекстного менеджера с закрытием сессии."""
+        """Выход из контекстного менеджера."""
         await self.close()
 
-    async def _get_session(self) -> aiohttp.ClientSession:
-        """Получает или создаёт HTTP сессию.
+    async def _get_session(self, pool: str = _POOL_API) -> aiohttp.ClientSession:
+        """Возвращает общую для процесса HTTP сессию пула.
+
+        Args:
+            pool: Имя пула: API (по умолчанию) или CDN картинок.
 
         Returns:
             Активная aiohttp сессия с настроенными таймаутами и коннектором.
         """
-        if self._session is None or self._session.closed:
-            connector = aiohttp.TCPConnector(
-                limit=50,
-                limit_per_host=20,
-                ttl_dns_cache=300
-            )
-            # Таймаут побольше для API, но не для картинок
-            timeout = aiohttp.ClientTimeout(total=8)
-            # trust_env=True позволит использовать системные прокси (HTTPS_PROXY)
-            self._session = aiohttp.ClientSession(
-                timeout=timeout,
-                connector=connector,
-                trust_env=True
-            )
-        return self._session
+        return _get_shared_session(pool)
 
     async def close(self) -> None:
-        """Закрывает HTTP сессию и освобождает ресурсы."""
-        if self._session and not self._session.closed:
-            await self._session.close()
+        """Закрывает клиент.
+
+        HTTP сессии общие для всех клиентов процесса и здесь не закрываются:
+        её закрывает :func:`close_shared_session` при остановке приложения.
+        """
+
+    async def _single_flight(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[_T]]
+    ) -> _T:
+        """Выполняет загрузку один раз на ключ для всех одновременных вызовов.
+
+        Первый вызов запускает задачу, остальные ждут её результата.
+        Запись удаляется, как только задача завершилась, поэтому словарь
+        не растёт с числом разных ключей. Отмена одного из ожидающих не
+        прерывает загрузку для остальных; если отменены все ожидающие,
+        загрузка отменяется, чтобы не тратить запросы (и повторы) впустую.
+
+        Args:
+            key: Ключ загрузки.
+            factory: Фабрика корутины загрузки.
+
+        Returns:
+            Результат загрузки.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+
+            def forget(done: asyncio.Task[Any]) -> None:
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+            task.add_done_callback(forget)
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # shield: отмена одного ожидающего не отменяет общую загрузку
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+                # Новый вызов с тем же ключом не должен получить отменённую задачу
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
 
     async def _with_retries(
         self,
-        coro_factory: Callable[[], asyncio.Future],
+        coro_factory: Callable[[], Awaitable[_T]],
         *,
         attempts: int = 3,
         base_delay: float = 0.3
-    ) -> Any:
+    ) -> _T:
         """Выполняет корутину с автоматическими повторными попытками.
 
+        Фабрика выполняет запрос целиком — от отправки до чтения и разбора
+        тела — и возвращает готовый результат, поэтому оборванное чтение
+        ответа повторяется так же, как неудачное соединение. Временные
+        ошибки WB фабрика сообщает через _raise_for_retriable.
+
         Args:
             coro_factory: Фабрика для создания корутины.
             attempts: Количество попыток (по умолчанию 3).
-            base_delay: Базовая задержка между попытками в секундах.
+            base_delay: Минимальная задержка между попытками в секундах;
+                фактическая выбирается случайно («decorrelated jitter»),
+                чтобы одновременно упавшие запросы не повторялись хором.
 
         Returns:
             Результат выполнения корутины.
 
         Raises:
-            Exception: Последнее исключение, если все попытки неудачны.
+            Exception: Последнее исключение, если все попытки неудачны,
+                или первое исключение, после которого повтор не поможет.
         """
-        last_exc: Exception | None = None
+        sleep = base_delay
         for i in range(attempts):
             try:
                 return await coro_factory()
-            except (asyncio.TimeoutError, ClientConnectorError) as exc:
-                last_exc = exc
-                delay = base_delay * (2 ** i)
+            except _RETRIABLE_ERRORS as exc:
+                if i == attempts - 1:
+                    raise
+                # Если WB просит подождать, следуем Retry-After вместо своей
+                # задержки
+                delay = getattr(exc, "retry_after", None)
+                if delay is None:
+                    sleep = _decorrelated_jitter(base_delay, sleep)
+                    delay = sleep
                 await asyncio.sleep(delay)
-            except Exception as exc:  # noqa: BLE001
-                last_exc = exc
-                break
-        if last_exc:
-            raise last_exc
+        raise ValueError("attempts должно быть больше 0")
 
     async def get_product_position(
         self,
@@ -130,6 +610,9 @@ class WBClient:
         """Находит позицию товара в поисковой выдаче Wildberries.
 
         Параллельно запрашивает первые N страниц поиска и ищет товар с указанным SKU.
+        Если товар найден на первой странице, загрузка следующих отменяется.
+        Страницы выдачи кэшируются на 30 секунд и общие для всех артикулов,
+        одновременные запросы одной страницы объединяются.
 
         Args:
             sku: Артикул товара (SKU).
@@ -149,47 +632,87 @@ class WBClient:
         session = await self._get_session()
         per_page = 100
         max_pages = 2
+        # "id":<sku> с любыми пробелами и без продолжения цифрами; ложное
+        # совпадение (вложенный id) отсеется полным разбором страницы
+        sku_re = re.compile(rb'"id"\s*:\s*%d(?!\d)' % int(sku))
 
-        async def fetch_page(page: int) -> tuple[int, list[dict[str, Any]] | None]:
+        # Общие для всех страниц параметры и заголовки собираются один раз
+        app_type = _map_device_to_app_type(device)
+        base_params = {
+            "query": query,
+            "dest": dest,
+            "resultset": "catalog",
+            "appType": app_type,
+        }
+        headers = _headers(device)
+        search_sem = _host_semaphore(WB_SEARCH_URL, WB_SEARCH_CONCURRENCY)
+        search_limiter = _get_search_limiter()
+
+        async def load_page(
+            key: tuple[str, int, int, int],
+            page: int
+        ) -> Optional[bytes]:
+            """Загружает сырую страницу поиска и кладёт её в кэш."""
+            params = {**base_params, "page": page}
+
+            async def do_request() -> Optional[bytes]:
+                async with search_sem, search_limiter:
+                    async with session.get(
+                        WB_SEARCH_URL,
+                        params=params,
+                        headers=headers
+                    ) as resp:
+                        _raise_for_retriable(resp)
+                        if resp.status != 200:
+                            return None
+                        return await resp.read()
+
+            body = await self._with_retries(do_request)
+            if body is not None:
+                self._search_cache.set(key, body)
+            return body
+
+        async def fetch_page(page: int) -> list[dict[str, Any]] | None:
             """Запрашивает одну страницу результатов поиска."""
-            params = {
-                "query": query,
-                "dest": dest,
-                "resultset": "catalog",
-                "page": page,
-                "appType": _map_device_to_app_type(device),
-            }
+            key = (query, dest, app_type, page)
             start = time.perf_counter()
             try:
-                async def do_request() -> Any:
-                    return await session.get(
-                        WB_SEARCH_URL,
-                        params=params,
-                        headers=_headers(device)
+                body = self._search_cache.get(key)
+                if body is None:
+                    body = await self._single_flight(
+                        ("search", *key), lambda: load_page(key, page)
                     )
-                
-                async with await self._with_retries(do_request) as resp:
-                    if resp.status != 200:
-                        return page, None
-                    data: dict[str, Any] = await resp.json(content_type=None)
-                    products = data.get("data", {}).get("products")
-                    return page, products if isinstance(products, list) else None
+                if body is None:
+                    return None
+                # Без артикула в сырых байтах страницу не разбираем: JSON
+                # декодируется только там, где товар может быть
+                if sku_re.search(body) is None:
+                    return []
+                return _parse_search_products(body)
             except Exception:
                 # Любой сбой превращаем в отсутствующие данные
-                return page, None
+                return None
             finally:
                 elapsed = time.perf_counter() - start
                 logger.debug(f"Поиск WB страница {page} '{query}' занял {elapsed:.2f}с")
 
-        pages = list(range(1, max_pages + 1))
-        results = await asyncio.gather(*(fetch_page(p) for p in pages))
-        
-        for page, products in sorted(results, key=lambda x: x[0]):
-            if not products:
-                continue
-            for idx, item in enumerate(products, start=1):
-                if int(item.get("id", 0)) == int(sku):
-                    return (page - 1) * per_page + idx
+        # Страницы качаются параллельно, а проверяются по порядку: как только
+        # товар найден, оставшиеся загрузки отменяются. Позиция на поздней
+        # странице засчитывается только после проверки всех предыдущих
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(fetch_page(page))
+                for page in range(1, max_pages + 1)
+            ]
+            for page, task in enumerate(tasks, start=1):
+                products = await task
+                if not products:
+                    continue
+                for idx, item in enumerate(products, start=1):
+                    if int(item.get("id", 0)) == int(sku):
+                        for rest in tasks[page:]:
+                            rest.cancel()
+                        return (page - 1) * per_page + idx
         return None
 
     async def get_product_preview(
@@ -198,10 +721,13 @@ class WBClient:
         sku: int,
         device: str,
         dest: int
-    ) -> Tuple[Optional[str], str, str]:
+    ) -> ProductPreview:
         """Получает превью товара: название, URL картинки и URL страницы.
 
-        Использует кэш для минимизации запросов к API.
+        Использует кэш по ключу (sku, device, dest) для минимизации запросов
+        к API. Одновременные запросы одного и того же товара объединяются
+        в один HTTP запрос. Неудачный ответ кэшируется ненадолго, чтобы
+        временный сбой API быстро перепроверялся.
 
         Args:
             sku: Артикул товара.
@@ -209,20 +735,52 @@ class WBClient:
             dest: Код региона.
 
         Returns:
-            Кортеж (название, URL картинки, URL страницы товара).
+            Превью товара; поле ok показывает, был ли ответ API успешным.
 
         Example:
             >>> async with WBClient() as client:  # doctest: +SKIP
-            ...     name, img_url, page_url = await client.get_product_preview(
+            ...     preview = await client.get_product_preview(
             ...         sku=12345, device="pc", dest=-1257786
             ...     )
+            ...     print(preview.name if preview.ok else "нет данных")
         """
-        now = time.time()
-        cached = self._preview_cache.get(sku)
-        if cached and cached[3] > now:
-            return cached[0], cached[1], cached[2]
+        key = (sku, device, dest)
+        cached = self._preview_cache.get(key)
+        if cached is not None:
+            return cached
+
+        async def load() -> ProductPreview:
+            preview = await self._load_product_preview(
+                sku=sku, device=device, dest=dest
+            )
+            ttl = None if preview.ok else (
+                _PREVIEW_NEGATIVE_TTL_SECONDS
+                + random.random() * _PREVIEW_NEGATIVE_JITTER_SECONDS
+            )
+            self._preview_cache.set(key, preview, ttl)
+            return preview
+
+        return await self._single_flight(("preview", *key), load)
+
+    async def _load_product_preview(
+        self,
+        *,
+        sku: int,
+        device: str,
+        dest: int
+    ) -> ProductPreview:
+        """Запрашивает превью товара у API карточек без использования кэша.
+
+        Args:
+            sku: Артикул товара.
+            device: Тип устройства.
+            dest: Код региона.
 
+        Returns:
+            Превью товара; ok=False, если ответ не получен или не разобран.
+        """
         name: Optional[str] = None
+        ok = False
         page_url = build_product_url(sku)
         image_url = build_image_url(sku)
         
@@ -235,31 +793,34 @@ class WBClient:
                 "nm": sku
             }
             start = time.perf_counter()
+            card_sem = _host_semaphore(WB_CARD_URL, WB_CARD_CONCURRENCY)
             
-            async def do_request() -> Any:
-                return await session.get(
-                    WB_CARD_URL,
-                    params=params,
-                    headers=_headers(device)
-                )
+            async def do_request() -> Optional[dict[str, Any]]:
+                async with card_sem:
+                    async with session.get(
+                        WB_CARD_URL,
+                        params=params,
+                        headers=_headers(device)
+                    ) as resp:
+                        _raise_for_retriable(resp)
+                        if resp.status != 200:
+                            return None
+                        body = await resp.read()
+                return orjson.loads(body)
             
-            async with await self._with_retries(do_request) as resp:
-                if resp.status == 200:
-                    data: dict[str, Any] = await resp.json(content_type=None)
-                    products = data.get("data", {}).get("products") or []
-                    if products:
-                        name = products[0].get("name")
+            data = await self._with_retries(do_request)
+            if data is not None:
+                products = data.get("data", {}).get("products") or []
+                if products:
+                    name = products[0].get("name")
+                ok = True
             
             logger.debug(
                 f"Получение карточки WB для {sku} заняло {time.perf_counter()-start:.2f}с"
             )
         except Exception as exc:  # noqa: BLE001
             logger.debug(f"Не удалось получить карточку WB для {sku}: {exc}")
-        
-        # Сохраняем в кэш
-        exp = now + self._cache_ttl_seconds
-        self._preview_cache[sku] = (name, image_url, page_url, exp)
-        return name, image_url, page_url
+        return ProductPreview(name, image_url, page_url, ok)
 
     async def fetch_image_bytes(
         self,
@@ -270,16 +831,21 @@ class WBClient:
     ) -> Optional[bytes]:
         """Загружает изображение по URL.
 
+        Тело читается кусками с ограничением _IMAGE_MAX_BYTES: слишком
+        большие ответы отбрасываются по Content-Length ещё до чтения или
+        как только превысят лимит.
+
         Args:
             url: URL изображения.
             total_timeout: Таймаут запроса в секундах.
             attempts: Количество попыток загрузки.
 
         Returns:
-            Байты изображения или None при неудаче.
+            Байты изображения или None при неудаче или слишком большом
+            изображении.
         """
         try:
-            session = await self._get_session()
+            session = await self._get_session(_POOL_IMAGES)
             headers = {
                 "User-Agent": _headers("pc")["User-Agent"],
                 "Referer": "https://www.wildberries.ru/"
@@ -287,28 +853,71 @@ class WBClient:
             # Короткий таймаут только для картинки
             timeout = aiohttp.ClientTimeout(total=total_timeout)
             
-            async def do_request() -> Any:
-                return await session.get(url, headers=headers, timeout=timeout)
+            async def do_request() -> Optional[bytes]:
+                async with session.get(url, headers=headers, timeout=timeout) as resp:
+                    _raise_for_retriable(resp)
+                    if resp.status != 200:
+                        return None
+                    if (resp.content_length or 0) > _IMAGE_MAX_BYTES:
+                        logger.debug(f"Изображение WB слишком большое: {url}")
+                        return None
+                    buf = bytearray()
+                    async for chunk in resp.content.iter_chunked(_IMAGE_CHUNK_SIZE):
+                        buf += chunk
+                        # Content-Length может отсутствовать или врать
+                        if len(buf) > _IMAGE_MAX_BYTES:
+                            logger.debug(f"Изображение WB слишком большое: {url}")
+                            return None
+                    return bytes(buf)
             
-            for i in range(attempts):
-                try:
-                    async with await do_request() as resp:
-                        if resp.status == 200:
-                            return await resp.read()
-                except Exception as exc:  # noqa: BLE001
-                    if i == attempts - 1:
-                        logger.debug(f"Не удалось загрузить изображение WB: {exc}")
-                        break
-                    await asyncio.sleep(0.2 * (2 ** i))
+            return await self._with_retries(
+                do_request, attempts=attempts, base_delay=0.2
+            )
         except Exception as exc:  # noqa: BLE001
             logger.debug(f"Не удалось загрузить изображение WB: {exc}")
         return None
 
+    async def _probe_image(
+        self,
+        url: str,
+        *,
+        total_timeout: float = 3.0
+    ) -> Optional[bool]:
+        """Проверяет наличие изображения HEAD запросом, не скачивая тело.
+
+        Args:
+            url: URL изображения.
+            total_timeout: Таймаут запроса в секундах.
+
+        Returns:
+            True, если картинка есть; False, если сервер ответил 404;
+            None, если ответ неоднозначен (сбой сети, HEAD не поддержан) —
+            тогда наличие проверяется обычной загрузкой.
+        """
+        try:
+            session = await self._get_session(_POOL_IMAGES)
+            headers = {
+                "User-Agent": _headers("pc")["User-Agent"],
+                "Referer": "https://www.wildberries.ru/"
+            }
+            timeout = aiohttp.ClientTimeout(total=total_timeout)
+            async with session.head(url, headers=headers, timeout=timeout) as resp:
+                if resp.status == 200:
+                    return True
+                if resp.status == 404:
+                    return False
+        except Exception as exc:  # noqa: BLE001
+            logger.debug(f"Не удалось проверить изображение WB: {exc}")
+        return None
+
     async def fetch_image_bytes_for_sku(self, sku: int) -> Optional[bytes]:
         """Загружает изображение товара по SKU с кэшированием.
 
-        Пробует разные размеры изображений (big, tm, small). Использует
-        кэш для избежания повторных загрузок.
+        Сначала сразу скачивается размер big. Только если его нет, наличие
+        остальных размеров (tm, small) проверяется одновременными HEAD
+        запросами, и скачивается лучший из доступных.
+        Использует кэш для избежания повторных загрузок, одновременные
+        запросы одного артикула объединяются.
 
         Args:
             sku: Артикул товара.
@@ -320,34 +929,73 @@ class WBClient:
             >>> async with WBClient() as client:  # doctest: +SKIP
             ...     img = await client.fetch_image_bytes_for_sku(12345)
         """
-        now = time.time()
-        
         # Проверяем негативный кэш (чтобы не пытаться повторно)
-        neg_exp = self._image_negative_cache.get(sku)
-        if neg_exp and neg_exp > now:
+        if self._image_negative_cache.get(sku):
             return None
-        
+
         # Проверяем обычный кэш
         cached = self._image_cache.get(sku)
-        if cached and cached[1] > now:
-            return cached[0]
-        
-        # Пробуем загрузить разные размеры
-        for size in ("big", "tm", "small"):
-            url = build_image_url(sku, size=size)
-            data = await self.fetch_image_bytes(url)
+        if cached is not None:
+            return cached
+
+        async def load() -> Optional[bytes]:
+            best, *rest = [
+                build_image_url(sku, size=size) for size in _IMAGE_SIZES
+            ]
+            # Обычно big есть: одна загрузка без лишних проверок
+            data = await self.fetch_image_bytes(best)
+            if not data:
+                found = await asyncio.gather(
+                    *(self._probe_image(url) for url in rest)
+                )
+                # Скачиваем по приоритету размеры, которых нет только по 404
+                for url, exists in zip(rest, found):
+                    if exists is False:
+                        continue
+                    data = await self.fetch_image_bytes(url)
+                    if data:
+                        break
             if data:
-                self._image_cache[sku] = (data, now + self._cache_ttl_seconds)
+                self._image_cache.set(sku, data)
                 return data
-        
-        # Сохраняем в негативный кэш на 5 минут
-        self._image_negative_cache[sku] = now + 300
-        return None
 
+            # Сохраняем в негативный кэш (TTL кэша — 5 минут)
+            self._image_negative_cache.set(sku, True)
+            return None
+
+        return await self._single_flight(("image", sku), load)
+
+    async def fetch_image_bytes_many(
+        self,
+        skus: list[int]
+    ) -> dict[int, Optional[bytes]]:
+        """Загружает изображения нескольких товаров параллельно.
+
+        Все запросы идут через общую HTTP сессию клиента и используют
+        тот же кэш, что и fetch_image_bytes_for_sku.
 
+        Args:
+            skus: Список артикулов товаров.
+
+        Returns:
+            Словарь {артикул: байты изображения или None}.
+
+        Example:
+            >>> async with WBClient() as client:  # doctest: +SKIP
+            ...     images = await client.fetch_image_bytes_many([12345, 67890])
+        """
+        results = await asyncio.gather(
+            *(self.fetch_image_bytes_for_sku(sku) for sku in skus)
+        )
+        return dict(zip(skus, results))
+
+
+@lru_cache(maxsize=16)
 def _map_device_to_app_type(device: str) -> int:
     """Преобразует название устройства в appType для API Wildberries.
 
+    Результат кэшируется: набор устройств мал и фиксирован.
+
     Args:
         device: Тип устройства (pc/android/ios/и т.д.).
 
@@ -370,33 +1018,42 @@ def _map_device_to_app_type(device: str) -> int:
     return 1
 
 
-def _headers(device: str) -> dict[str, str]:
+# User-Agent по типу устройства; неизвестные устройства получают UA "pc"
+_USER_AGENTS: Mapping[str, str] = MappingProxyType({
+    "pc": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "android": "Mozilla/5.0 (Linux; Android 12; Pixel 5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Mobile Safari/537.36",
+    "ios": "Mozilla/5.0 (iPhone; CPU iPhone OS 15_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.0 Mobile/15E148 Safari/604.1",
+})
+
+
+@lru_cache(maxsize=16)
+def _headers(device: str) -> Mapping[str, str]:
     """Возвращает HTTP заголовки с User-Agent для указанного устройства.
 
+    Результат кэшируется и поэтому неизменяем.
+
     Args:
         device: Тип устройства (pc/android/ios).
 
     Returns:
-        Словарь с заголовками.
+        Неизменяемый словарь с заголовками.
 
     Example:
         >>> headers = _headers("pc")
         >>> "User-Agent" in headers
         True
     """
-    ua_map = {
-        "pc": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
-        "android": "Mozilla/5.0 (Linux; Android 12; Pixel 5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Mobile Safari/537.36",
-        "ios": "Mozilla/5.0 (iPhone; CPU iPhone OS 15_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.0 Mobile/15E148 Safari/604.1",
-    }
-    device = device.lower()
-    ua = ua_map.get(device, ua_map["pc"])
-    return {"User-Agent": ua}
+    ua = _USER_AGENTS.get(device.lower(), _USER_AGENTS["pc"])
+    return MappingProxyType({"User-Agent": ua})
 
 
+@lru_cache(maxsize=4096)
 def build_image_url(nm_id: int, size: str = "big") -> str:
     """Строит URL изображения товара Wildberries.
 
+    Результат кэшируется по (артикул, размер): при пакетной загрузке
+    картинок одни и те же URL строятся многократно.
+
     Args:
         nm_id: Артикул товара.
         size: Размер изображения (big/tm/small).
@@ -408,8 +1065,10 @@ def build_image_url(nm_id: int, size: str = "big") -> str:
         >>> build_image_url(12345678, "big")  # doctest: +SKIP
         'https://images.wbstatic.net/big/new/123/12345/12345678-1.jpg'
     """
-    vol = nm_id // 100000
+    # nm_id // 100000 == (nm_id // 1000) // 100: второе деление — над
+    # уже маленьким числом
     part = nm_id // 1000
+    vol = part // 100
     return f"https://images.wbstatic.net/{size}/new/{vol}/{part}/{nm_id}-1.jpg"
 
 
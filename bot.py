@@ -6,35 +6,120 @@
 """
 
 import asyncio
-from functools import partial
+import hmac
+import importlib
+import multiprocessing
+import time
+from collections import OrderedDict
 from urllib.parse import urlparse
-import re
 import secrets
 import string
+import sys
+from typing import Any, Awaitable, Callable
 
+import orjson
 from aiohttp import web
 from loguru import logger
-from aiogram import Bot, Dispatcher
+from aiogram import Bot, Dispatcher, Router
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler
 
 from app.config import settings
-from app.db.base import init_db
-from app.handlers.start import router as start_router
-from app.handlers.articles import router as articles_router
-from app.handlers.settings import router as settings_router
-from app.handlers.manual_check import router as manual_router
-from app.handlers.tracking import router as tracking_router
+from app.db.base import engine, init_db
 from app.scheduler import setup_scheduler, shutdown_scheduler
-from app.services.tracker import run_hourly_tracking
+from app.services import user_cache
+from app.services.tracker import (
+    close_redis_locks,
+    run_hourly_tracking,
+    start_send_workers,
+    stop_send_workers,
+    use_redis_locks,
+)
+from app.services.wb_client import WBClient, close_shared_session
+
+
+# Модули с роутерами обработчиков в порядке регистрации в диспетчере.
+# Импортируются в build_dispatcher: импорт bot (например, ради утилит)
+# не тянет за собой все обработчики
+_ROUTER_MODULES: tuple[str, ...] = (
+    "app.handlers.start",
+    "app.handlers.articles",
+    "app.handlers.tracking",
+    "app.handlers.settings",
+    "app.handlers.manual_check",
+)
+
+# Путь webhook из WEBHOOK_URL; настройки неизменны, вычисляем один раз
+_WEBHOOK_PATH = urlparse(settings.webhook_url or "/webhook").path or "/webhook"
+
+# Готовое тело ответа health-check: не кодируется заново на каждую проверку
+_HEALTH_BODY = b"ok"
+
+# CRON_SECRET в байтах для сравнения; настройки неизменны, читаем один раз
+_CRON_SECRET: bytes | None = (
+    settings.cron_secret.encode() if settings.cron_secret else None
+)
+
+# Служебные эндпоинты, защищённые CRON_SECRET
+_PROTECTED_PATHS = frozenset({"/cron", "/debug/pool"})
+# Не чаще одного запроса к служебным эндпоинтам с адреса за столько секунд
+_PROTECTED_MIN_INTERVAL_SECONDS = 1.0
+# Сколько последних адресов помнить для ограничения частоты
+_PROTECTED_CLIENTS_MAXSIZE = 1024
+
+# Допустимые символы секретного токена webhook: строка — для генерации,
+# множество — для проверки
+_ALLOWED_SECRET_CHARS = string.ascii_letters + string.digits + "_-"
+_ALLOWED_SECRET_SET = frozenset(_ALLOWED_SECRET_CHARS)
 
 
-# Регулярное выражение для валидации секретного токена webhook
-_ALLOWED_SECRET_RE = re.compile(r"^[A-Za-z0-9_-]{1,256}$")
-# Допустимые символы для генерации секретного токена
-_ALLOWED_SECRET_CHARS = string.ascii_letters + string.digits + "_-"
+def _configure_logging(path: str = "bot.log") -> None:
+    """Добавляет файловый лог.
+
+    Записи уходят в файл из фонового потока (enqueue), чтобы запись на
+    диск не блокировала цикл событий. Ротация по 10 МБ, хранятся 10
+    сжатых архивов. diagnose отключён: он разворачивает локальные
+    переменные кадров при каждом логируемом исключении.
+
+    enqueue упорядочивает записи только внутри процесса, поэтому каждый
+    файл должен писать ровно один процесс.
+
+    Args:
+        path: Путь к файлу лога.
+    """
+    logger.add(
+        path,
+        rotation="10 MB",
+        retention=10,
+        compression="gz",
+        enqueue=True,
+        backtrace=False,
+        diagnose=False
+    )
+
+
+def _loop_factory() -> Callable[[], asyncio.AbstractEventLoop]:
+    """Возвращает фабрику цикла событий: uvloop, если он доступен.
+
+    uvloop (libuv) быстрее стандартного цикла на сетевом вводе-выводе.
+    На Windows он не работает, а без установленного пакета используется
+    стандартный цикл asyncio.
+
+    Returns:
+        Функция, создающая новый цикл событий.
+    """
+    if sys.platform != "win32":
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            return uvloop.new_event_loop
+    return asyncio.new_event_loop
 
 
 def _normalize_secret_token(raw_secret: str | None) -> str | None:
@@ -62,7 +147,9 @@ def _normalize_secret_token(raw_secret: str | None) -> str | None:
     """
     if not raw_secret:
         return None
-    if _ALLOWED_SECRET_RE.match(raw_secret):
+    # Проверка множеством вместо regex: "$" в re.match пропускал бы
+    # завершающий перевод строки
+    if len(raw_secret) <= 256 and _ALLOWED_SECRET_SET.issuperset(raw_secret):
         return raw_secret
     logger.warning(
         "WEBHOOK_SECRET содержит недопустимые символы. "
@@ -71,11 +158,79 @@ def _normalize_secret_token(raw_secret: str | None) -> str | None:
     return "".join(secrets.choice(_ALLOWED_SECRET_CHARS) for _ in range(48))
 
 
+def _build_storage() -> BaseStorage:
+    """Создаёт хранилище состояний FSM.
+
+    С заданным REDIS_URL состояния хранятся в Redis и общие для всех
+    процессов бота; иначе — в памяти текущего процесса.
+
+    Returns:
+        Хранилище состояний для диспетчера.
+    """
+    if settings.redis_url:
+        # Импорт здесь: пакет redis нужен только с REDIS_URL
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(settings.redis_url)
+    return MemoryStorage()
+
+
+def _json_dumps(value: Any) -> str:
+    """Сериализует запрос к Bot API в JSON строку через orjson.
+
+    Args:
+        value: Данные запроса.
+
+    Returns:
+        JSON строка.
+    """
+    return orjson.dumps(value).decode()
+
+
+def _create_bot() -> Bot:
+    """Создаёт экземпляр бота с HTML-разметкой по умолчанию.
+
+    JSON ответов Bot API и обновлений, приходящих на webhook, разбирается
+    через orjson вместо стандартного json.
+
+    Returns:
+        Экземпляр Telegram бота.
+    """
+    return Bot(
+        token=settings.telegram_token,
+        session=AiohttpSession(json_loads=orjson.loads, json_dumps=_json_dumps),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+
+async def _close_bot(bot: Bot, *, delete_webhook: bool) -> None:
+    """Удаляет webhook (по запросу) и закрывает HTTP сессию бота.
+
+    Ошибки не прерывают остановку, но пишутся в лог, а не теряются.
+
+    Args:
+        bot: Экземпляр Telegram бота.
+        delete_webhook: Удалить ли webhook перед закрытием сессии.
+    """
+    if delete_webhook:
+        try:
+            await bot.delete_webhook(drop_pending_updates=False)
+        except Exception as exc:  # noqa: BLE001
+            logger.debug(f"Не удалось удалить webhook: {exc}")
+    try:
+        await bot.session.close()
+    except Exception as exc:  # noqa: BLE001
+        logger.debug(f"Не удалось закрыть сессию бота: {exc}")
+    # Даём SSL транспортам aiohttp закрыться до остановки цикла событий
+    await asyncio.sleep(0.25)
+
+
 def build_dispatcher() -> Dispatcher:
     """Создаёт и настраивает диспетчер бота со всеми роутерами.
 
-    Инициализирует диспетчер с хранилищем в памяти и регистрирует все
-    обработчики команд и сообщений в правильном порядке.
+    Инициализирует диспетчер с хранилищем состояний (Redis или память,
+    см. _build_storage) и регистрирует все
+    обработчики команд и сообщений в правильном порядке. Создаёт общий
+    для всех обработчиков WBClient, доступный им как аргумент ``wb_client``.
 
     Returns:
         Настроенный экземпляр Dispatcher со всеми подключёнными роутерами.
@@ -84,12 +239,11 @@ def build_dispatcher() -> Dispatcher:
         >>> dp = build_dispatcher()
         >>> # диспетчер готов к обработке сообщений
     """
-    dp = Dispatcher(storage=MemoryStorage())
-    dp.include_router(start_router)
-    dp.include_router(articles_router)
-    dp.include_router(tracking_router)
-    dp.include_router(settings_router)
-    dp.include_router(manual_router)
+    dp = Dispatcher(storage=_build_storage())
+    dp["wb_client"] = WBClient()
+    for module_name in _ROUTER_MODULES:
+        router: Router = importlib.import_module(module_name).router
+        dp.include_router(router)
     return dp
 
 
@@ -107,15 +261,13 @@ async def start_polling_mode() -> None:
         >>> await start_polling_mode()  # doctest: +SKIP
         # Бот начинает опрос сообщений
     """
-    logger.add("bot.log", rotation="10 MB")
+    _configure_logging()
     await init_db()
     if not settings.telegram_token:
         raise RuntimeError("TELEGRAM_TOKEN не задан")
-    bot = Bot(
-        token=settings.telegram_token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+    bot = _create_bot()
     dp = build_dispatcher()
+    start_send_workers(bot)
     if settings.scheduler_enabled:
         await setup_scheduler(bot)
     logger.info("Запуск бота в режиме polling")
@@ -125,33 +277,34 @@ async def start_polling_mode() -> None:
         logger.info("Получен сигнал остановки")
     finally:
         await shutdown_scheduler()
-        try:
-            await bot.session.close()
-        except Exception:
-            pass
+        await stop_send_workers()
+        await dp["wb_client"].close()
+        await close_shared_session()
+        await dp.storage.close()
+        await _close_bot(bot, delete_webhook=False)
         logger.info("Бот остановлен")
 
 
-async def on_startup(
-    app: web.Application,
-    bot: Bot,
-    dp: Dispatcher,
-    secret_token: str | None
-) -> None:
+async def on_startup(app: web.Application) -> None:
     """Обработчик запуска веб-приложения в режиме webhook.
 
     Инициализирует базу данных, настраивает планировщик и устанавливает
-    webhook для получения обновлений от Telegram.
+    webhook для получения обновлений от Telegram. При нескольких рабочих
+    процессах это делает только основной; остальные лишь запускают воркеры
+    уведомлений.
 
     Args:
-        app: Экземпляр aiohttp веб-приложения.
-        bot: Экземпляр Telegram бота.
-        dp: Диспетчер для обработки обновлений.
-        secret_token: Секретный токен для валидации webhook запросов.
+        app: Экземпляр aiohttp веб-приложения; бот, секретный токен и
+            признак основного процесса берутся из app["bot"],
+            app["secret_token"] и app["primary"].
 
     Raises:
         RuntimeError: Если переменная окружения WEBHOOK_URL не установлена.
     """
+    bot: Bot = app["bot"]
+    start_send_workers(bot)
+    if not app["primary"]:
+        return
     await init_db()
     if settings.scheduler_enabled:
         await setup_scheduler(bot)
@@ -159,30 +312,38 @@ async def on_startup(
         raise RuntimeError("WEBHOOK_URL не задан")
     await bot.set_webhook(
         url=settings.webhook_url,
-        secret_token=secret_token,
+        secret_token=app["secret_token"],
         drop_pending_updates=True
     )
     logger.info("Webhook установлен: {}", settings.webhook_url)
 
 
-async def on_cleanup(app: web.Application, bot: Bot) -> None:
+async def on_cleanup(app: web.Application) -> None:
     """Обработчик завершения работы веб-приложения.
 
-    Останавливает планировщик, удаляет webhook и закрывает сессию бота.
+    Останавливает планировщик, прогон по cron и воркеры уведомлений,
+    закрывает общий WBClient, клиент блокировок Redis и хранилище
+    состояний, удаляет webhook и закрывает сессию бота. Webhook удаляет только основной процесс.
 
     Args:
-        app: Экземпляр aiohttp веб-приложения.
-        bot: Экземпляр Telegram бота.
+        app: Экземпляр aiohttp веб-приложения; бот, диспетчер и признак
+            основного процесса берутся из app["bot"], app["dp"] и
+            app["primary"].
     """
+    bot: Bot = app["bot"]
+    dp: Dispatcher = app["dp"]
     await shutdown_scheduler()
-    try:
-        await bot.delete_webhook(drop_pending_updates=False)
-    except Exception:
-        pass
-    try:
-        await bot.session.close()
-    except Exception:
-        pass
+    # Прерываем прогон по cron, чтобы он не писал в закрытые сессии
+    cron_tasks: set[asyncio.Task] = app["cron_tasks"]
+    for task in cron_tasks:
+        task.cancel()
+    await asyncio.gather(*cron_tasks, return_exceptions=True)
+    await stop_send_workers()
+    await dp["wb_client"].close()
+    await close_shared_session()
+    await close_redis_locks()
+    await dp.storage.close()
+    await _close_bot(bot, delete_webhook=app["primary"])
     logger.info("Бот остановлен")
 
 
@@ -195,7 +356,54 @@ def healthcheck(_: web.Request) -> web.Response:
     Returns:
         HTTP ответ со статусом 200 и текстом "ok".
     """
-    return web.Response(text="ok")
+    return web.Response(body=_HEALTH_BODY, content_type="text/plain")
+
+
+def _cron_secret_ok(request: web.Request) -> bool:
+    """Проверяет секрет из query параметра 's' за постоянное время.
+
+    Args:
+        request: HTTP запрос к служебному эндпоинту.
+
+    Returns:
+        True, если параметр совпадает с CRON_SECRET.
+    """
+    supplied = request.rel_url.query.get("s", "")
+    # compare_digest не выдаёт по времени, сколько символов совпало
+    return hmac.compare_digest(supplied.encode(), _CRON_SECRET or b"")
+
+
+def _make_protected_rate_limit() -> Callable[..., Awaitable[web.StreamResponse]]:
+    """Создаёт middleware, ограничивающий частоту запросов к служебным эндпоинтам.
+
+    Запросы к _PROTECTED_PATHS с одного адреса чаще раза в
+    _PROTECTED_MIN_INTERVAL_SECONDS получают 429 до проверки секрета.
+    Остальные пути (webhook, health-check) не ограничиваются.
+
+    Returns:
+        Middleware для aiohttp приложения.
+    """
+    # Адрес клиента -> время последнего запроса; старые адреса вытесняются
+    last_seen: OrderedDict[str, float] = OrderedDict()
+
+    @web.middleware
+    async def middleware(
+        request: web.Request,
+        handler: Callable[[web.Request], Awaitable[web.StreamResponse]]
+    ) -> web.StreamResponse:
+        if request.path not in _PROTECTED_PATHS:
+            return await handler(request)
+        remote = request.remote or ""
+        now = time.monotonic()
+        prev = last_seen.pop(remote, None)
+        last_seen[remote] = now
+        if len(last_seen) > _PROTECTED_CLIENTS_MAXSIZE:
+            last_seen.popitem(last=False)
+        if prev is not None and now - prev < _PROTECTED_MIN_INTERVAL_SECONDS:
+            return web.Response(status=429)
+        return await handler(request)
+
+    return middleware
 
 
 async def cron_handler(request: web.Request) -> web.Response:
@@ -207,66 +415,173 @@ async def cron_handler(request: web.Request) -> web.Response:
     Args:
         request: HTTP запрос с query параметром 's' для авторизации.
 
+    Пока предыдущий запущенный так прогон не завершился, новый не
+    стартует; прогон, уже идущий в другом процессе, отсекает блокировка
+    в Redis внутри run_hourly_tracking.
+
     Returns:
         HTTP ответ со статусом 200 при успехе или 403 при неверном токене.
 
     Example:
         GET /cron?s=secret_token
     """
-    secret = request.query.get("s")
-    if settings.cron_secret and secret != settings.cron_secret:
-        return web.Response(status=403, text="forbidden")
-    # Запускаем отслеживание немедленно
+    if _CRON_SECRET and not _cron_secret_ok(request):
+        return web.Response(status=403)
+    # Один прогон за раз: повторные вызовы во время прогона не запускают
+    # параллельные проверки, нагружающие WB и БД
+    tasks: set[asyncio.Task] = request.app["cron_tasks"]
+    if tasks:
+        return web.Response(text="already running")
+    # Запускаем отслеживание немедленно; ссылка на задачу хранится до её
+    # завершения, чтобы сборщик мусора не уничтожил её на середине
     bot: Bot = request.app["bot"]
-    asyncio.create_task(run_hourly_tracking(bot))
+    task = asyncio.create_task(run_hourly_tracking(bot))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
     return web.Response(text="ok")
 
 
-def run_webhook_server() -> None:
-    """Запускает бота в режиме webhook сервера.
+async def debug_pool_handler(request: web.Request) -> web.Response:
+    """Обработчик отладочного эндпоинта состояния пула соединений с БД.
 
-    Создаёт aiohttp веб-сервер для приёма обновлений от Telegram через webhook.
-    Дополнительно предоставляет эндпоинты для health-check и внешнего cron.
+    Защищён тем же секретом, что и cron-триггер; без заданного CRON_SECRET
+    эндпоинт недоступен.
 
-    Raises:
-        RuntimeError: Если переменная окружения TELEGRAM_TOKEN не установлена.
+    Args:
+        request: HTTP запрос с query параметром 's' для авторизации.
+
+    Returns:
+        HTTP ответ со строкой состояния пула или 403 при неверном токене.
 
     Example:
-        >>> run_webhook_server()  # doctest: +SKIP
-        # Сервер запущен на 0.0.0.0:8080
+        GET /debug/pool?s=secret_token
     """
-    logger.add("bot.log", rotation="10 MB")
-    if not settings.telegram_token:
-        raise RuntimeError("TELEGRAM_TOKEN не задан")
-    bot = Bot(
-        token=settings.telegram_token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    if not _CRON_SECRET or not _cron_secret_ok(request):
+        return web.Response(status=403)
+    return web.Response(text=engine.pool.status())
+
+
+def _serve_webhook(
+    worker_index: int,
+    workers: int,
+    secret_token: str | None
+) -> None:
+    """Запускает один процесс webhook сервера.
+
+    При нескольких процессах кэш пользователей отключается (его
+    инвалидация не видна другим процессам), а прогоны отслеживания и
+    проверки одного пользователя разделяются блокировками в Redis:
+    /cron может попасть в любой процесс.
+
+    Args:
+        worker_index: Номер процесса; 0 — основной, он устанавливает
+            webhook и запускает планировщик.
+        workers: Общее число процессов.
+        secret_token: Секретный токен webhook, общий для всех процессов.
+    """
+    # Ротацию и сжатие одного файла из разных процессов ничто не
+    # согласует: основной пишет bot.log, остальные — свои файлы
+    _configure_logging(
+        "bot.log" if worker_index == 0 else f"bot.{worker_index}.log"
     )
+    if workers > 1:
+        user_cache.disable()
+        use_redis_locks(settings.redis_url)
+    bot = _create_bot()
     dp = build_dispatcher()
-    app = web.Application()
-    # Определяем путь webhook из WEBHOOK_URL
-    path = urlparse(settings.webhook_url or "/webhook").path or "/webhook"
-    secret_token = _normalize_secret_token(settings.webhook_secret)
+    app = web.Application(middlewares=[_make_protected_rate_limit()])
     handler = SimpleRequestHandler(
         dispatcher=dp,
         bot=bot,
         secret_token=secret_token
     )
-    handler.register(app, path)
+    handler.register(app, _WEBHOOK_PATH)
     app["bot"] = bot
+    app["dp"] = dp
+    app["secret_token"] = secret_token
+    app["primary"] = worker_index == 0
+    app["cron_tasks"] = set()
     app.router.add_get("/health", healthcheck)
     app.router.add_get("/cron", cron_handler)
-    app.on_startup.append(
-        partial(on_startup, bot=bot, dp=dp, secret_token=secret_token)
-    )
-    app.on_cleanup.append(partial(on_cleanup, bot=bot))
+    app.router.add_get("/debug/pool", debug_pool_handler)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
     logger.info(
-        "Запуск webhook сервера на {}:{} (путь: {})",
+        "Запуск webhook сервера на {}:{} (путь: {}, процесс {})",
         settings.app_host,
         settings.app_port,
-        path
+        _WEBHOOK_PATH,
+        worker_index
+    )
+    loop = _loop_factory()()
+    asyncio.set_event_loop(loop)
+    web.run_app(
+        app,
+        host=settings.app_host,
+        port=settings.app_port,
+        # Несколько процессов слушают один порт, ядро распределяет соединения
+        reuse_port=workers > 1,
+        loop=loop
     )
-    web.run_app(app, host=settings.app_host, port=settings.app_port)
+
+
+def run_webhook_server() -> None:
+    """Запускает бота в режиме webhook сервера.
+
+    Создаёт aiohttp веб-сервер для приёма обновлений от Telegram через webhook.
+    Дополнительно предоставляет эндпоинты для health-check и внешнего cron.
+    Сервер работает на цикле событий uvloop, если он доступен.
+
+    При WEB_WORKERS > 1 запускает столько процессов на одном порту
+    (SO_REUSEPORT). Это требует REDIS_URL: иначе состояния FSM одного
+    пользователя окажутся в разных процессах, и сервер работает одним
+    процессом. Кэш пользователей в этом режиме отключён, прогоны
+    отслеживания разделяет блокировка в Redis; кэш file_id картинок у
+    каждого процесса свой.
+
+    Raises:
+        RuntimeError: Если переменная окружения TELEGRAM_TOKEN не установлена.
+
+    Example:
+        >>> run_webhook_server()  # doctest: +SKIP
+        # Сервер запущен на 0.0.0.0:8080
+    """
+    if not settings.telegram_token:
+        raise RuntimeError("TELEGRAM_TOKEN не задан")
+    # Токен вычисляется один раз: сгенерированный взамен невалидного должен
+    # быть одинаковым во всех процессах
+    secret_token = _normalize_secret_token(settings.webhook_secret)
+    workers = settings.web_workers
+    if workers > 1 and (not settings.redis_url or sys.platform == "win32"):
+        logger.warning(
+            "WEB_WORKERS > 1 требует REDIS_URL и не поддерживается на Windows; "
+            "сервер запускается одним процессом"
+        )
+        workers = 1
+    if workers <= 1:
+        _serve_webhook(0, 1, secret_token)
+        return
+    # spawn: дочерние процессы не наследуют состояние родителя (сессии,
+    # циклы событий) и строят всё сами
+    ctx = multiprocessing.get_context("spawn")
+    children = [
+        ctx.Process(
+            target=_serve_webhook,
+            args=(index, workers, secret_token),
+            name=f"webhook-{index}",
+            daemon=True
+        )
+        for index in range(1, workers)
+    ]
+    for child in children:
+        child.start()
+    try:
+        _serve_webhook(0, workers, secret_token)
+    finally:
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.join()
 
 
 if __name__ == "__main__":
@@ -274,6 +589,7 @@ if __name__ == "__main__":
         if settings.webhook_enabled and settings.webhook_url:
             run_webhook_server()
         else:
-            asyncio.run(start_polling_mode())
+            with asyncio.Runner(loop_factory=_loop_factory()) as runner:
+                runner.run(start_polling_mode())
     except KeyboardInterrupt:
         logger.info("Прервано пользователем")
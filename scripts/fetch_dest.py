@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import asyncio
+import re
 import sys
 from typing import Any
 
@@ -10,10 +11,47 @@ import aiohttp
 
 URL = "https://user-geo-data.wildberries.ru/get-geo-info"
 
+# Параметр dest в строке xinfo вида "appType=1&curr=rub&dest=-1257786&..."
+_DEST_RE = re.compile(r"(?:^|&)dest=(-?\d+)")
+
+# Общая HTTP сессия: повторные вызовы fetch_dest переиспользуют
+# keep-alive соединения и DNS кэш вместо нового TLS рукопожатия
+_session: aiohttp.ClientSession | None = None
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Возвращает общую HTTP сессию, создавая её при первом обращении.
+
+    Returns:
+        Активная aiohttp сессия.
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=20),
+            connector=aiohttp.TCPConnector(
+                limit=100,
+                ttl_dns_cache=300,
+                keepalive_timeout=30
+            )
+        )
+    return _session
+
+
+async def close_session() -> None:
+    """Закрывает общую HTTP сессию; вызывается после последнего fetch_dest."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
 
 async def fetch_dest(latitude: float, longitude: float, address: str) -> int | None:
     """Получает dest-код региона из API Wildberries.
 
+    Использует общую HTTP сессию модуля; по завершении работы её нужно
+    закрыть через close_session().
+
     Args:
         latitude: Широта.
         longitude: Долгота.
@@ -23,17 +61,16 @@ async def fetch_dest(latitude: float, longitude: float, address: str) -> int | N
         dest-код региона или None при ошибках.
     """
     params = {"latitude": latitude, "longitude": longitude, "address": address}
-    async with aiohttp.ClientSession(
-        timeout=aiohttp.ClientTimeout(total=20)
-    ) as session:
-        async with session.get(URL, params=params) as resp:
-            resp.raise_for_status()
-            data: dict[str, Any] = await resp.json(content_type=None)
-            xinfo = data.get("xinfo", "")
-            for part in str(xinfo).split("&"):
-                if part.startswith("dest="):
-                    return int(part.split("=", 1)[1])
-    return None
+    session = _get_session()
+    async with session.get(
+        URL,
+        params=params,
+        headers={"Accept": "application/json"}
+    ) as resp:
+        resp.raise_for_status()
+        data: dict[str, Any] = await resp.json(content_type=None)
+    match = _DEST_RE.search(str(data.get("xinfo", "")))
+    return int(match.group(1)) if match else None
 
 
 async def main() -> None:
@@ -44,7 +81,10 @@ async def main() -> None:
     lat = float(sys.argv[1])
     lon = float(sys.argv[2])
     addr = " ".join(sys.argv[3:])
-    dest = await fetch_dest(lat, lon, addr)
+    try:
+        dest = await fetch_dest(lat, lon, addr)
+    finally:
+        await close_session()
     print(dest)
 
 
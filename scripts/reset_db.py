@@ -3,13 +3,14 @@
 from __future__ import annotations
 
 import asyncio
+import random
 import sys
 from pathlib import Path
-from time import sleep
 
 from loguru import logger
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 
 # Добавляем корень проекта в sys.path
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -21,14 +22,18 @@ from app.config import settings  # noqa: E402
 async def _drop_create_schema(engine_url: str) -> None:
     """Удаляет и создаёт схему wbpos в PostgreSQL.
 
+    Движок без пула: он выполняет одну транзакцию и сразу закрывается.
+
     Args:
         engine_url: URL подключения к БД.
     """
-    engine = create_async_engine(engine_url, echo=False, pool_pre_ping=True)
-    async with engine.begin() as conn:
-        await conn.execute(text("DROP SCHEMA IF EXISTS wbpos CASCADE"))
-        await conn.execute(text("CREATE SCHEMA wbpos"))
-    await engine.dispose()
+    engine = create_async_engine(engine_url, echo=False, poolclass=NullPool)
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP SCHEMA IF EXISTS wbpos CASCADE"))
+            await conn.execute(text("CREATE SCHEMA wbpos"))
+    finally:
+        await engine.dispose()
 
 
 async def reset_schema(retries: int = 3) -> None:
@@ -50,7 +55,8 @@ async def reset_schema(retries: int = 3) -> None:
         except Exception as exc:  # noqa: BLE001
             last_exc = exc
             logger.error(f"Attempt {attempt} failed: {exc}")
-            sleep(1.0 * attempt)
+            # Не блокируем цикл событий; разброс разводит повторы реплик
+            await asyncio.sleep(attempt + random.random() * 0.5)
     if last_exc:
         raise last_exc
 